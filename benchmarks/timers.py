@@ -0,0 +1,185 @@
+"""Load and drift benchmark for the timer scheduler.
+
+Seeds a database with synthetic reminders and tempmutes, then runs the Timers cog
+against a fake bot that records when each timer is dispatched instead of sending
+anything. The timers table is truncated, so never point this at a real database.
+
+    python -m benchmarks.timers --database postgres://localhost/robo_coder_bench
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import time
+
+import asyncpg
+
+from cogs import timers
+from cogs.utils import db, migrations
+
+class Sink:
+    """Records when each timer was dispatched."""
+
+    def __init__(self):
+        self.received = {}
+        self.first = None
+        self.last = None
+
+    def record(self, timer):
+        now = datetime.datetime.utcnow()
+        self.received[timer.id] = (now-timer.expires_at).total_seconds()
+        self.first = self.first or time.perf_counter()
+        self.last = time.perf_counter()
+
+    async def on_tempmute_complete(self, timer):
+        self.record(timer)
+
+    async def send_reminders(self, channel_id, timers):
+        for timer in timers:
+            self.record(timer)
+
+class FakeBot:
+    def __init__(self, loop, pool, sink):
+        self.loop = loop
+        self.db = pool
+        self.extra_events = {"on_tempmute_complete": [sink.on_tempmute_complete]}
+
+    async def wait_until_ready(self):
+        pass
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values)-1, round(percent / 100 * (len(values)-1)))]
+
+async def seed(pool, *, pending, due, start, window):
+    await pool.execute("TRUNCATE timers;")
+
+    # Reminders and tempmutes alternate, spread across a handful of channels and guilds
+    query = """INSERT INTO timers (event, guild_id, channel_id, user_id, data, expires_at, created_at)
+               SELECT
+                   CASE WHEN i % 2 = 0 THEN 'reminder' ELSE 'tempmute' END,
+                   i % 50,
+                   CASE WHEN i % 2 = 0 THEN i % 100 END,
+                   i,
+                   CASE WHEN i % 2 = 0 THEN jsonb_build_object('jump_url', '', 'content', 'Benchmark') ELSE '{}'::jsonb END,
+                   $2 + random() * $3 * interval '1 second',
+                   $4
+               FROM generate_series(1, $1) AS i;
+            """
+
+    now = datetime.datetime.utcnow()
+    # Nothing is listening yet, so don't send a notification for every seeded row
+    await pool.execute("ALTER TABLE timers DISABLE TRIGGER timers_notify;")
+    try:
+        # Pending timers are spread over the next month, so most are beyond the scheduler's horizon
+        await pool.execute(query, pending, start+datetime.timedelta(seconds=window), 30*24*60*60.0, now)
+        await pool.execute(query, due, start, window, now)
+    finally:
+        await pool.execute("ALTER TABLE timers ENABLE TRIGGER timers_notify;")
+
+async def run(args):
+    async def init(connection): await connection.set_type_codec("jsonb", schema="pg_catalog", encoder=json.dumps, decoder=json.loads, format="text")
+    pool = db.InstrumentedPool(await asyncpg.create_pool(args.database, init=init))
+    await migrations.Migrator(pool).upgrade()
+
+    start = datetime.datetime.utcnow()+datetime.timedelta(seconds=args.delay)
+    print(f"Seeding {args.pending} pending and {args.due} due timers...")
+    began = time.perf_counter()
+    await seed(pool, pending=args.pending, due=args.due, start=start, window=args.window)
+    print(f"Seeded in {time.perf_counter()-began:.1f}s")
+
+    sink = Sink()
+    bot = FakeBot(asyncio.get_event_loop(), pool, sink)
+    pool.reset_stats()
+
+    cog = timers.Timers(bot)
+    cog.send_reminders = sink.send_reminders
+
+    # Wait for the scheduler's first load, so the cancellations and creations below happen while it's running
+    loaded = asyncio.Event()
+    load_timers = cog.load_timers
+
+    async def load_and_signal():
+        await load_timers()
+        loaded.set()
+
+    cog.load_timers = load_and_signal
+    began = time.perf_counter()
+    await loaded.wait()
+    print(f"Scheduler loaded {len(cog.entries)} timers in {time.perf_counter()-began:.1f}s")
+
+    # Cancel some of the due timers the way the remind cancel command does
+    query = """DELETE FROM timers
+               WHERE timers.id IN (
+                   SELECT id FROM timers
+                   WHERE timers.expires_at <= $1
+                   ORDER BY random()
+                   LIMIT $2
+               )
+               RETURNING id;
+            """
+    canceled = await pool.fetch(query, start+datetime.timedelta(seconds=args.window), int(args.due*args.cancel))
+    for record in canceled:
+        cog.cancel_timer(record["id"])
+
+    # Create timers in a burst while the scheduler is running, due somewhere in the window
+    await asyncio.gather(*[
+        cog.create_timer("tempmute", start+datetime.timedelta(seconds=random.random()*args.window), datetime.datetime.utcnow(), guild_id=0, user_id=0)
+        for _ in range(args.create)
+    ])
+
+    expected = args.due-len(canceled)+args.create
+    deadline = time.perf_counter()+args.delay+args.window+args.timeout
+    while len(sink.received) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.5)
+
+    # Let the last dispatches finish deleting their rows before counting queries
+    await asyncio.sleep(1)
+    cog.cog_unload()
+
+    drift = list(sink.received.values())
+    queries = sum(stats.latency.count for stats in pool.statements.values())
+    elapsed = (sink.last-sink.first) if sink.first else 0
+
+    print()
+    print(f"Dispatched: {len(drift)}/{expected} ({len(canceled)} canceled, {args.create} created while running)")
+    print(f"Drift p50: {percentile(drift, 50)*1000:.1f}ms, p99: {percentile(drift, 99)*1000:.1f}ms, max: {max(drift, default=0)*1000:.1f}ms")
+    print(f"Throughput: {len(drift)/elapsed if elapsed else 0:.0f} timers/s over {elapsed:.1f}s")
+    print(f"Queries: {queries} ({queries/len(drift) if drift else 0:.3f} per dispatched timer)")
+    print(f"Pool: max {pool.max_in_use} connections in use, p99 acquire wait {pool.acquire_wait.percentile(99)}ms")
+
+    print()
+    for stats in sorted(pool.statements.values(), key=lambda stats: stats.latency.count, reverse=True):
+        print(f"{stats.latency.count:>8} {stats.latency.mean:>8.2f}ms  {stats.statement[:100]}")
+
+    if not args.keep:
+        await pool.execute("TRUNCATE timers;")
+    await pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the timer scheduler against a throwaway database")
+    parser.add_argument("--database", default=os.environ.get("BENCHMARK_DATABASE_URI"), help="database URI, defaults to $BENCHMARK_DATABASE_URI")
+    parser.add_argument("--pending", type=int, default=1_000_000, help="timers due after the window")
+    parser.add_argument("--due", type=int, default=10_000, help="timers due during the window")
+    parser.add_argument("--window", type=float, default=60, help="seconds the due timers are spread over")
+    parser.add_argument("--delay", type=float, default=5, help="seconds before the window starts")
+    parser.add_argument("--cancel", type=float, default=0.1, help="fraction of due timers to cancel")
+    parser.add_argument("--create", type=int, default=1000, help="timers to create while the scheduler runs")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for stragglers after the window")
+    parser.add_argument("--keep", action="store_true", help="don't truncate the timers table afterwards")
+    args = parser.parse_args()
+
+    if not args.database:
+        parser.error("a database is required")
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.get_event_loop().run_until_complete(run(args))
+
+if __name__ == "__main__":
+    main()
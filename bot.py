@@ -1,26 +1,28 @@
 import discord
 from discord.ext import commands
+from discord.ext.commands.view import StringView
 
 import aiohttp
+import asyncio
 import asyncpg
+import contextlib
 import datetime
-import googletrans
 import json
 import logging
+import psutil
 import sys
+import time
 
-from cogs.utils import config
+from cogs.utils import cache, db, migrations, prefixes
 
 log = logging.getLogger("robo_coder")
 logging.basicConfig(level=logging.INFO, format="(%(asctime)s) %(levelname)s %(message)s", datefmt="%m/%d/%y - %H:%M:%S %Z")
 
+# Everything up to here is interpreter startup and imports
+imports_took = time.time()-psutil.Process().create_time()
+
 def get_prefix(bot, message):
-    prefixes = [f"<@!{bot.user.id}> ", f"<@{bot.user.id}> "]
-    if message.guild:
-        prefixes.extend(bot.prefixes.get(message.guild.id, ["r!", "r."]))
-    else:
-        prefixes.extend(["r!", "r.", "!"])
-    return prefixes
+    return bot.prefixes.get_matcher(message.guild).prefixes
 
 extensions = [
     "cogs.admin",
@@ -35,6 +37,33 @@ extensions = [
     "cogs.tools"
 ]
 
+class BootTimer:
+    """Records how long each phase of startup takes."""
+
+    def __init__(self):
+        self.phases = []
+        self.reported = False
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter()-start)
+
+    async def timed(self, name, coro):
+        with self.phase(name):
+            return await coro
+
+    def report(self):
+        width = max(len(name) for name, seconds in self.phases)
+        lines = [f"{name:<{width}} {seconds*1000:>8.0f}ms" for name, seconds in self.phases]
+        return "\n".join(lines)
+
 class RoboCoder(commands.Bot):
     def __init__(self):
         intents = discord.Intents.default()
@@ -44,30 +73,40 @@ class RoboCoder(commands.Bot):
 
         self.support_server_link = "https://discord.gg/eHxvStNJb7"
         self.uptime = datetime.datetime.utcnow()
-        self.prefixes = config.Config("prefixes.json", loop=self.loop)
-        self.translator = googletrans.Translator()
+        self.prefixes = prefixes.Prefixes(self)
         self.players = {}
         self.spam_detectors = {}
 
+        self.boot = BootTimer()
+        self.boot.record("imports", imports_took)
+
         with open("assets/emojis.json") as file:
             self.default_emojis = json.load(file)
 
-        self.load_extension("jishaku")
-        self.get_cog("Jishaku").hidden = True
+        with self.boot.phase("extension jishaku"):
+            self.load_extension("jishaku")
+            self.get_cog("Jishaku").hidden = True
 
+        self.load_extensions()
+
+    def load_extensions(self):
         for extension in extensions:
             try:
-                self.load_extension(extension)
+                with self.boot.phase(f"extension {extension}"):
+                    self.load_extension(extension)
             except Exception as exc:
                 log.info("Couldn't load extension %s", extension, exc_info=exc)
 
     async def create_pool(self):
         async def init(connection): await connection.set_type_codec("jsonb", schema="pg_catalog", encoder=json.dumps, decoder=json.loads, format="text")
-        self.db = await asyncpg.create_pool(self.config.database_uri, init=init)
+        pool = await asyncpg.create_pool(self.config.database_uri, init=init)
+        self.db = db.InstrumentedPool(pool, slow_query=getattr(self.config, "slow_query", 0.25))
+
+        await migrations.Migrator(self.db).upgrade()
 
-        with open("schema.sql") as file:
-            schema = file.read()
-            await self.db.execute(schema)
+        self.cache_listener = cache.InvalidationListener(self.db)
+        await self.cache_listener.start()
+        await self.prefixes.load()
 
     async def create_session(self):
         self.session = aiohttp.ClientSession(loop=self.loop)
@@ -78,7 +117,14 @@ class RoboCoder(commands.Bot):
         return self.prefixes.get(guild.id, [self.user.mention])[0]
 
     def get_guild_prefixes(self, guild):
-        return self.prefixes.get(guild.id, ["r!", "r."])
+        return list(self.prefixes.get(guild.id, prefixes.DEFAULT_PREFIXES))
+
+    async def get_context(self, message, *, cls=commands.Context):
+        # Most messages aren't commands, so reject the ones that can't start with a prefix before doing any more work
+        if not self.prefixes.get_matcher(message.guild).could_match(message.content):
+            return cls(prefix=None, view=StringView(message.content), bot=self, message=message)
+
+        return await super().get_context(message, cls=cls)
 
     async def stop_players(self):
         for player in self.players.copy().values():
@@ -96,20 +142,41 @@ class RoboCoder(commands.Bot):
             data = await resp.json()
             return f"https://mystb.in/{data['key']}"
 
+    async def start(self, *args, **kwargs):
+        bot = kwargs.pop("bot", True)
+        reconnect = kwargs.pop("reconnect", True)
+
+        # Nothing here depends on anything else, so do it all at once instead of waiting for on_connect
+        await asyncio.gather(
+            self.boot.timed("database pool", self.create_pool()),
+            self.boot.timed("session", self.create_session()),
+            self.boot.timed("login", self.login(*args, bot=bot))
+        )
+
+        self.connect_started = time.perf_counter()
+        await self.connect(reconnect=reconnect)
+
     async def on_ready(self):
         log.info(f"Logged in as {self.user.name} - {self.user.id}")
 
+        report = None
+        if not self.boot.reported:
+            self.boot.reported = True
+            self.boot.record("READY", time.perf_counter()-self.connect_started)
+            self.boot.record("total", time.time()-psutil.Process().create_time())
+            report = self.boot.report()
+            log.info("Startup timings:\n%s", report)
+
+        # The matchers include our mention, which might not have been known when they were built
+        self.prefixes.clear_matchers()
+
         self.console = bot.get_channel(self.config.console)
         if self.config.status_hook:
             await self.status_webhook.send("Recevied READY event")
+            if report:
+                await self.status_webhook.send(f"Startup timings\n```\n{report}\n```")
 
     async def on_connect(self):
-        if not hasattr(self, "session"):
-            await self.create_session()
-
-        if not hasattr(self, "db"):
-            await self.create_pool()
-
         if self.config.status_hook:
             await self.status_webhook.send("Connected to Discord")
 
@@ -131,13 +198,22 @@ class RoboCoder(commands.Bot):
             await self.status_webhook.send("Logging out of Discord")
 
         await self.stop_players()
+        await self.cache_listener.close()
         await self.db.close()
         await self.session.close()
         await super().close()
 
+    @discord.utils.cached_property
+    def translator(self):
+        # googletrans is slow to import, so wait until something actually needs it
+        import googletrans
+        return googletrans.Translator()
+
     @discord.utils.cached_property
     def config(self):
         return __import__("config")
 
-bot = RoboCoder()
-bot.run()
+# youtube_dl workers are spawned, which imports this file again, so only start the bot when run directly
+if __name__ == "__main__":
+    bot = RoboCoder()
+    bot.run()
@@ -1,4 +1,5 @@
 import asyncio
+import datetime
 import importlib
 import io
 import logging
@@ -15,7 +16,7 @@ import psutil
 from discord.ext import commands, tasks
 from jishaku import codeblocks
 
-from .utils import formats, menus
+from .utils import cache, formats, human_time, menus, migrations
 
 log = logging.getLogger("robo_coder.admin")
 
@@ -163,6 +164,47 @@ class Admin(commands.Cog):
         except discord.HTTPException:
             await ctx.send(file=discord.File(io.BytesIO(str(results).encode("utf-8")), filename="result.txt"))
 
+    @commands.group(name="migrations", description="View pending database migrations", invoke_without_command=True)
+    async def migrations_status(self, ctx):
+        pending = await migrations.Migrator(self.bot.db).pending()
+        if not pending:
+            return await ctx.send("The database schema is up to date")
+
+        pending = "\n".join([str(migration) for migration in pending])
+        await ctx.send(f"Pending migrations:\n```\n{pending}\n```")
+
+    @migrations_status.command(name="dry", description="Run pending migrations and roll them back", aliases=["dryrun"])
+    async def migrations_dry(self, ctx):
+        try:
+            pending = await migrations.Migrator(self.bot.db).upgrade(dry_run=True)
+        except Exception as exc:
+            full = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+            return await ctx.send(f":x: Dry run failed\n```py\n{full}```")
+
+        if not pending:
+            return await ctx.send("The database schema is up to date")
+
+        await ctx.send(f":white_check_mark: Dry run of {formats.plural(len(pending)):migration} succeeded and was rolled back")
+
+    @migrations_status.command(name="apply", description="Apply pending migrations", aliases=["upgrade"])
+    async def migrations_apply(self, ctx):
+        pending = await migrations.Migrator(self.bot.db).pending()
+        if not pending:
+            return await ctx.send("The database schema is up to date")
+
+        joined = "\n".join([str(migration) for migration in pending])
+        result = await menus.Confirm(f"Are you sure you want to apply the following migrations?\n{joined}").prompt(ctx)
+        if not result:
+            return await ctx.send("Aborting")
+
+        try:
+            applied = await migrations.Migrator(self.bot.db).upgrade()
+        except Exception as exc:
+            full = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+            return await ctx.send(f":x: Migration failed\n```py\n{full}```")
+
+        await ctx.send(f":white_check_mark: Applied {formats.plural(len(applied)):migration}")
+
     @commands.command(name="process", description="View system stats", aliases=["system", "health"])
     async def process(self, ctx):
         em = discord.Embed(title="Process", color=0x96c8da)
@@ -174,8 +216,101 @@ class Admin(commands.Cog):
         disk = psutil.disk_usage("/")
         em.add_field(name="Disk", value=f"{humanize.naturalsize(disk.used)}/{humanize.naturalsize(disk.total)} ({disk.percent}% used)")
 
+        db = self.bot.db
+        em.add_field(name="Database", value=f"{db.in_use}/{db.get_max_size()} connections in use (peak {db.max_in_use}), {db.acquire_timeouts} acquire timeouts")
+
+        music = self.bot.get_cog("Music")
+        if music:
+            pool = music.ytdl_pool
+            em.add_field(name="youtube_dl Workers", value=f"{pool.running}/{pool.size} busy, {pool.queued} queued (peak {pool.max_queued}, p99 wait {pool.queue_wait.percentile(99):.0f}ms), {pool.completed} done, {pool.failures} failed, {pool.timeouts} timed out")
+
         await ctx.send(embed=em)
 
+    @commands.group(name="dbstats", description="View database query statistics", invoke_without_command=True)
+    async def dbstats(self, ctx, limit: int = 15):
+        db = self.bot.db
+        statements = sorted(db.statements.values(), key=lambda stats: stats.latency.total, reverse=True)[:limit]
+
+        wait = db.acquire_wait
+        message = (
+            f"Started recording {human_time.timedelta(datetime.datetime.utcfromtimestamp(db.started), accuracy=2)}\n"
+            f"Pool: {db.in_use} in use (peak {db.max_in_use}), {db.get_size()}/{db.get_max_size()} open, {db.get_idle_size()} idle\n"
+            f"Acquires: {wait.count}, mean wait {wait.mean:.1f}ms, p99 {wait.percentile(99):.0f}ms, max {wait.max:.0f}ms, {db.acquire_timeouts} timeouts\n"
+        )
+
+        if not statements:
+            return await ctx.send(message)
+
+        table = formats.Tabulate()
+        table.add_columns(["Statement", "Calls", "Errors", "Total", "Mean", "p50", "p99", "Max"])
+        for stats in statements:
+            latency = stats.latency
+            statement = stats.statement if len(stats.statement) <= 50 else f"{stats.statement[:47]}..."
+            table.add_row([statement, latency.count, stats.errors, f"{latency.total:.0f}ms", f"{latency.mean:.1f}ms", f"{latency.percentile(50):.0f}ms", f"{latency.percentile(99):.0f}ms", f"{latency.max:.0f}ms"])
+
+        results = f"{message}\n{table}"
+        try:
+            await ctx.send(f"```{results}```")
+        except discord.HTTPException:
+            await ctx.send(file=discord.File(io.BytesIO(results.encode("utf-8")), filename="dbstats.txt"))
+
+    @dbstats.command(name="slow", description="View recent slow queries")
+    async def dbstats_slow(self, ctx):
+        slow_queries = list(self.bot.db.slow_queries)
+        if not slow_queries:
+            return await ctx.send("No slow queries")
+
+        lines = [f"{query.milliseconds:.0f}ms {query.call_site} ({human_time.timedelta(datetime.datetime.utcfromtimestamp(query.when), accuracy=1)})\n    {query.statement}" for query in reversed(slow_queries)]
+        results = "\n".join(lines)
+        try:
+            await ctx.send(f"```{results}```")
+        except discord.HTTPException:
+            await ctx.send(file=discord.File(io.BytesIO(results.encode("utf-8")), filename="slow.txt"))
+
+    @dbstats.command(name="reset", description="Reset database query statistics")
+    async def dbstats_reset(self, ctx):
+        self.bot.db.reset_stats()
+        await ctx.send(":white_check_mark: Reset database statistics")
+
+    @commands.group(name="caches", description="View cache statistics", invoke_without_command=True)
+    async def caches(self, ctx):
+        if not cache.caches:
+            return await ctx.send("No caches to display")
+
+        table = formats.Tabulate()
+        table.add_columns(["Name", "Size", "Hits", "Misses", "Ratio", "Evictions", "Expirations", "Coalesced"])
+
+        for name, func in sorted(cache.caches.items()):
+            stats = func.stats
+            size = f"{len(func.cache)}/{func.cache.max_legnth}"
+            if func.cache.max_bytes:
+                size += f" ({humanize.naturalsize(func.cache.bytes, binary=True)}/{humanize.naturalsize(func.cache.max_bytes, binary=True)})"
+            table.add_row([name.split(".", 1)[-1], size, stats.hits, stats.misses, f"{stats.hit_ratio:.1%}", stats.evictions, stats.expirations, stats.coalesced])
+
+        results = str(table)
+        try:
+            await ctx.send(f"```{results}```")
+        except discord.HTTPException:
+            await ctx.send(file=discord.File(io.BytesIO(results.encode("utf-8")), filename="caches.txt"))
+
+    @caches.command(name="reset", description="Reset cache statistics")
+    async def caches_reset(self, ctx):
+        for func in cache.caches.values():
+            func.stats.reset()
+
+        await ctx.send(":white_check_mark: Reset cache statistics")
+
+    @caches.command(name="clear", description="Clear a cache or all caches")
+    async def caches_clear(self, ctx, name=None):
+        funcs = [func for key, func in cache.caches.items() if not name or key.endswith(name)]
+        if not funcs:
+            return await ctx.send(f":x: No cache matches `{name}`")
+
+        for func in funcs:
+            func.invalidate()
+
+        await ctx.send(f":white_check_mark: Cleared {formats.plural(len(funcs)):cache}")
+
     @commands.command(name="logout", description="Logs out the bot")
     @commands.is_owner()
     async def logout(self, ctx):
@@ -10,8 +10,6 @@ import zlib
 import discord
 from dateutil import parser
 from discord.ext import commands, menus
-from lxml import etree
-from PIL import Image
 
 LANGUAGES = {
     "af": "afrikaans",
@@ -338,6 +336,8 @@ class Internet(commands.Cog):
     @commands.command(name="google", description="Search google", aliases=["g"])
     @commands.cooldown(1, 20, commands.BucketType.user)
     async def google(self, ctx, *, query):
+        from lxml import etree
+
         async with ctx.typing():
             params = {"q": query, "safe": "on", "lr": "lang_en", "hl": "en"}
             headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:95.0) Gecko/20100101 Firefox/95.0"}
@@ -630,6 +630,8 @@ class Internet(commands.Cog):
     @commands.command(name="roblox", description="Get info on a Roblox user")
     @commands.cooldown(2, 20, commands.BucketType.user)
     async def roblox(self, ctx, username):
+        from lxml import etree
+
         async with ctx.typing():
             params = {"username": username}
             async with self.bot.session.get(f"http://api.roblox.com/users/get-by-username", params=params) as resp:
@@ -693,6 +695,8 @@ class Internet(commands.Cog):
     @commands.command(name="minecraft", description="Get info on a Minecraft user", aliases=["mc"])
     @commands.cooldown(1, 20, commands.BucketType.user)
     async def minecraft(self, ctx, username):
+        from PIL import Image
+
         async with ctx.typing():
             async with self.bot.session.get(f"https://api.mojang.com/users/profiles/minecraft/{username}") as resp:
                 if resp.status != 200:
@@ -870,6 +874,8 @@ class Internet(commands.Cog):
     async def build_faq_entries(self):
         """Builds the discord.py faq entries."""
 
+        from lxml import etree
+
         faq_url = "https://discordpy.readthedocs.io/en/latest/faq.html"
 
         entries = {}
@@ -227,7 +227,7 @@ class Meta(commands.Cog):
             return await ctx.send(":x: You cannot have more than 10 custom prefixes")
 
         prefixes.append(prefix)
-        await self.bot.prefixes.add(ctx.guild.id, prefixes)
+        await self.bot.prefixes.set(ctx.guild.id, prefixes)
 
         await ctx.send(f":white_check_mark: Added the prefix `{prefix}`")
 
@@ -239,7 +239,7 @@ class Meta(commands.Cog):
             return await ctx.send(":x: That prefix is not added")
 
         prefixes.remove(prefix)
-        await self.bot.prefixes.add(ctx.guild.id, prefixes)
+        await self.bot.prefixes.set(ctx.guild.id, prefixes)
 
         await ctx.send(f":white_check_mark: Removed the prefix `{prefix}`")
 
@@ -254,7 +254,7 @@ class Meta(commands.Cog):
             return await ctx.send(":x: You cannot have more than 10 prefixes")
 
         prefixes = [prefix] + prefixes
-        await self.bot.prefixes.add(ctx.guild.id, prefixes)
+        await self.bot.prefixes.set(ctx.guild.id, prefixes)
 
         await ctx.send(f":white_check_mark: Set `{prefix}` as the default prefix")
 
@@ -265,7 +265,7 @@ class Meta(commands.Cog):
         if not result:
             return await ctx.send("Aborting")
 
-        await self.bot.prefixes.add(ctx.guild.id, [])
+        await self.bot.prefixes.set(ctx.guild.id, [])
         await ctx.send(f":white_check_mark: Removed all prefixes")
 
     @prefix.command(name="reset", description="Reset the prefixes to the default prefixes")
@@ -275,7 +275,7 @@ class Meta(commands.Cog):
         if not result:
             return await ctx.send("Aborting")
 
-        await self.bot.prefixes.add(ctx.guild.id, ["r!", "r."])
+        await self.bot.prefixes.set(ctx.guild.id, ["r!", "r."])
         await ctx.send(f":white_check_mark: Reset prefixes")
 
     @prefix.command(name="list", description="View the prefixes in this server")
@@ -69,6 +69,11 @@ class GuildConfig:
     def log_channel(self):
         return self.bot.get_channel(self.log_channel_id)
 
+    async def broadcast_update(self):
+        # Other processes have their own copy of this config cached, so tell them to drop it
+        if cache.listener:
+            await cache.listener.publish(Moderation.get_guild_config.cache_name, (self.guild_id,))
+
     async def set_mute_role(self, role):
         self.muted = [member.id for member in role.members] if role else []
         self.mute_role_id = role.id if role else None
@@ -79,6 +84,7 @@ class GuildConfig:
                    SET mute_role_id=$2, muted=$3;
                 """
         await self.bot.db.execute(query, self.guild_id, self.mute_role_id, self.muted, self.spam_prevention, self.ignore_spam_channels, self.log_channel_id)
+        await self.broadcast_update()
 
     async def mute_member(self, member):
         self.muted.append(member.id)
@@ -89,6 +95,7 @@ class GuildConfig:
                    SET muted=$3;
                 """
         await self.bot.db.execute(query, self.guild_id, self.mute_role_id, self.muted, self.spam_prevention, self.ignore_spam_channels, self.log_channel_id)
+        await self.broadcast_update()
 
     async def unmute_member(self, member):
         self.muted.remove(member.id)
@@ -99,6 +106,7 @@ class GuildConfig:
                    SET muted=$3;
                 """
         await self.bot.db.execute(query, self.guild_id, self.mute_role_id, self.muted, self.spam_prevention, self.ignore_spam_channels, self.log_channel_id)
+        await self.broadcast_update()
 
     async def enable_spam_prevention(self):
         self.spam_prevention = True
@@ -109,6 +117,7 @@ class GuildConfig:
                    SET spam_prevention=$4;
                 """
         await self.bot.db.execute(query, self.guild_id, self.mute_role_id, self.muted, self.spam_prevention, self.ignore_spam_channels, self.log_channel_id)
+        await self.broadcast_update()
 
     async def disable_spam_prevention(self):
         self.spam_prevention = False
@@ -119,6 +128,7 @@ class GuildConfig:
                    SET spam_prevention=$4;
                 """
         await self.bot.db.execute(query, self.guild_id, self.mute_role_id, self.muted, self.spam_prevention, self.ignore_spam_channels, self.log_channel_id)
+        await self.broadcast_update()
 
     async def add_ignore_spam_channel(self, channel):
         self.ignore_spam_channels.append(channel.id)
@@ -129,6 +139,7 @@ class GuildConfig:
                    SET ignore_spam_channels=$5;
                 """
         await self.bot.db.execute(query, self.guild_id, self.mute_role_id, self.muted, self.spam_prevention, self.ignore_spam_channels, self.log_channel_id)
+        await self.broadcast_update()
 
     async def remove_ignore_spam_channel(self, channel):
         self.ignore_spam_channels.remove(channel.id)
@@ -139,6 +150,7 @@ class GuildConfig:
                    SET ignore_spam_channels=$5;
                 """
         await self.bot.db.execute(query, self.guild_id, self.mute_role_id, self.muted, self.spam_prevention, self.ignore_spam_channels, self.log_channel_id)
+        await self.broadcast_update()
 
 class ArgumentParser(argparse.ArgumentParser):
     def __init__(self):
@@ -271,7 +283,7 @@ class Moderation(commands.Cog):
         else:
             reason = f"Banned by {ctx.author}"
 
-        await self.delete_timer("tempban", [ctx.guild.id, user.id])
+        await self.delete_timer("tempban", ctx.guild.id, user.id)
 
         await ctx.guild.ban(user, reason=reason)
         await ctx.send(f":white_check_mark: Banned `{user}`")
@@ -293,12 +305,12 @@ class Moderation(commands.Cog):
         else:
             reason = f"Tempban by {ctx.author} for {delta}"
 
-        await self.delete_timer("tempban", [ctx.guild.id, user.id])
+        await self.delete_timer("tempban", ctx.guild.id, user.id)
 
         timers = self.bot.get_cog("Timers")
         if not timers:
             return await ctx.send(":x: This feature is temporarily unavailable")
-        await timers.create_timer("tempban", [ctx.guild.id, user.id], expires_at, created_at)
+        await timers.create_timer("tempban", expires_at, created_at, guild_id=ctx.guild.id, user_id=user.id)
 
         await ctx.guild.ban(user, reason=reason)
         await ctx.send(f":white_check_mark: Temporarily banned `{user}` for `{delta}`")
@@ -519,12 +531,12 @@ class Moderation(commands.Cog):
         else:
             reason = f"Tempmute by {ctx.author} for {delta}"
 
-        await self.delete_timer("tempmute", [ctx.guild.id, user.id])
+        await self.delete_timer("tempmute", ctx.guild.id, user.id)
 
         timers = self.bot.get_cog("Timers")
         if not timers:
             return await ctx.send(":x: This feature is temporarily unavailable")
-        await timers.create_timer("tempmute", [ctx.guild.id, user.id], expires_at, created_at)
+        await timers.create_timer("tempmute", expires_at, created_at, guild_id=ctx.guild.id, user_id=user.id)
 
         await user.add_roles(config.mute_role, reason=reason)
         await ctx.send(f":white_check_mark: Temporarily muted `{user}` for `{delta}`")
@@ -554,7 +566,7 @@ class Moderation(commands.Cog):
         timers = self.bot.get_cog("Timers")
         if not timers:
             return await ctx.send(":x: This feature is temporarily unavailable")
-        await timers.create_timer("tempmute", [ctx.guild.id, ctx.author.id], expires_at, created_at)
+        await timers.create_timer("tempmute", expires_at, created_at, guild_id=ctx.guild.id, user_id=ctx.author.id)
 
         result = await menus.Confirm(f"Are you sure you want to mute yourself for `{human_delta}`?").prompt(ctx)
         if not result:
@@ -771,7 +783,7 @@ class Moderation(commands.Cog):
         deleted = await method(ctx, limit+1)
         await ctx.send(f":white_check_mark: Deleted {formats.plural(len(deleted)):message}", delete_after=5)
 
-    @cache.cache()
+    @cache.cache(key={"guild": cache.attribute("id")})
     async def get_guild_config(self, guild):
         query = """SELECT *
                    FROM guild_config
@@ -800,7 +812,7 @@ class Moderation(commands.Cog):
         return deleted
 
     async def complex_cleanup(self, ctx, limit):
-        prefixes = self.bot.guild_prefixes[str(ctx.guild.id)]
+        prefixes = self.bot.get_guild_prefixes(ctx.guild)
         prefixes.append(self.bot.user.mention)
         deleted = await ctx.channel.purge(limit=limit, check=lambda message: message.author.id == self.bot.user.id or message.content.startswith(tuple(prefixes)))
         return deleted
@@ -816,18 +828,19 @@ class Moderation(commands.Cog):
         if config.mute_role > user.top_role:
             raise commands.BadArgument("The mute role is higher than your highest role")
 
-    async def delete_timer(self, event, data):
-        timers = self.bot.get_cog("Timers")
+    async def delete_timer(self, event, guild_id, user_id):
         query = """DELETE FROM timers
-                   WHERE timers.event=$1 AND timers.data=$2;
+                   WHERE timers.event=$1 AND timers.guild_id=$2 AND timers.user_id=$3
+                   RETURNING id;
                 """
-        result = await self.bot.db.execute(query, event, data)
+        records = await self.bot.db.fetch(query, event, guild_id, user_id)
 
-        if timers and timers.current_timer and timers.current_timer.event == "reminder" and timers.current_timer.data == data:
-            # The timer running is the one we canceled, so we need to restart the loop
-            self.restart_loop()
+        timers = self.bot.get_cog("Timers")
+        if timers:
+            for record in records:
+                timers.cancel_timer(record["id"])
 
-        return result != "DELETE 0"
+        return bool(records)
 
     def get_spam_action(self, config, spammer):
         return SpamAction.MUTE
@@ -865,7 +878,7 @@ class Moderation(commands.Cog):
                 if timers:
                     expires_at = datetime.datetime.utcnow()+spammer.mute_time
                     created_at = datetime.datetime.utcnow()
-                    await timers.create_timer("tempmute", [message.guild.id, message.author.id], expires_at, created_at)
+                    await timers.create_timer("tempmute", expires_at, created_at, guild_id=message.guild.id, user_id=message.author.id)
                     await message.author.add_roles(config.mute_role, reason=f"Automatic mute for spamming ({human_time.timedelta(spammer.mute_time)})")
             else:
                 await message.author.ban(reason=f"Automatic ban for spamming")
@@ -880,12 +893,12 @@ class Moderation(commands.Cog):
             await config.mute_member(after)
 
         elif config.mute_role_id not in [role.id for role in after.roles] and after.id in config.muted:
-            await self.delete_timer("tempmute", [after.guild.id, after.id])
+            await self.delete_timer("tempmute", after.guild.id, after.id)
             await config.unmute_member(after)
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild, user):
-        await self.delete_timer("tempban", [guild.id, user.id])
+        await self.delete_timer("tempban", guild.id, user.id)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
@@ -910,20 +923,20 @@ class Moderation(commands.Cog):
 
     @commands.Cog.listener()
     async def on_tempban_complete(self, timer):
-        guild = self.bot.get_guild(timer.data[0])
-        user = discord.Object(id=timer.data[1])
+        guild = self.bot.get_guild(timer.guild_id)
+        user = discord.Object(id=timer.user_id)
         await guild.unban(user, reason="Tempban is over")
 
     @commands.Cog.listener()
     async def on_tempmute_complete(self, timer):
-        guild = self.bot.get_guild(timer.data[0])
-        user = guild.get_member(timer.data[1])
+        guild = self.bot.get_guild(timer.guild_id)
+        user = guild.get_member(timer.user_id)
         config = await self.get_guild_config(guild)
 
         if user:
             await user.remove_roles(config.mute_role, reason=f"Tempmute is over")
         else:
-            await config.unmute_member(discord.Object(id=timer.data[1]))
+            await config.unmute_member(discord.Object(id=timer.user_id))
 
 def setup(bot):
     bot.add_cog(Moderation(bot))
@@ -1,4 +1,5 @@
 import asyncio
+import collections
 import datetime
 import functools
 import itertools
@@ -11,13 +12,51 @@ import urllib
 
 import discord
 import humanize
-import youtube_dl
 from discord.ext import commands, menus
 
-from .utils import errors, formats, human_time
+from .utils import errors, formats, human_time, workers
 
 log = logging.getLogger("robo_coder.music")
 
+async def resolve_in_order(func, items, *, concurrency):
+    """Calls func on each item with at most concurrency calls running at once.
+
+    Yields (item, result, exception) tuples in the same order as items, each as soon as it
+    and everything before it is done, so a slow item only holds up the ones after it.
+    """
+
+    items = iter(items)
+    pending = collections.deque()
+
+    def fill():
+        for item in itertools.islice(items, concurrency-len(pending)):
+            pending.append((item, asyncio.ensure_future(func(item))))
+
+    fill()
+    try:
+        while pending:
+            item, task = pending[0]
+            try:
+                result, exception = await task, None
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                result, exception = None, exc
+
+            # Only start the next item once this one is done, so there are never more than concurrency running
+            pending.popleft()
+            fill()
+            yield item, result, exception
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+def run_ytdl(search, *, download, flat=False):
+    """Extracts and optionally downloads a search or URL. This runs in a worker process."""
+
+    ytdl = Song.get_flat_ytdl() if flat else Song.get_ytdl()
+    return ytdl.extract_info(search, download=download)
+
 class SearchPages(menus.ListPageSource):
     def __init__(self, songs):
         self.songs = songs
@@ -110,7 +149,12 @@ class QueuePages(menus.ListPageSource):
 class Player:
     __slots__ = ("ctx", "voice", "queue", "_event",
                  "now", "notifications", "looping", "looping_queue", "_volume",
-                 "song_started", "pause_started", "loop")
+                 "song_started", "pause_started", "loop",
+                 "_prefetching", "_prefetch_semaphore")
+
+    # How many songs at the front of the queue are downloaded ahead of time, and how many at once
+    PREFETCH_COUNT = 2
+    PREFETCH_CONCURRENCY = 1
 
     def __init__(self, ctx, voice):
         self.ctx = ctx
@@ -126,6 +170,12 @@ class Player:
 
         self.song_started = None
         self.pause_started = None
+
+        # Maps songs to the task downloading them
+        self._prefetching = {}
+        self._prefetch_semaphore = asyncio.Semaphore(self.PREFETCH_CONCURRENCY, loop=self.bot.loop)
+        self.queue.on_put = self.prefetch
+
         self.loop = self.bot.loop.create_task(self.player_loop())
 
     def __str__(self):
@@ -221,6 +271,16 @@ class Player:
                             self.bot.players.pop(self.guild.id)
                         return
 
+                if not self.now.is_downloaded:
+                    # Usually the song was prefetched while the last one played, but otherwise we have to wait for it
+                    log.info("Waiting for song to download in %s", self)
+                    try:
+                        await self.download(self.now)
+                    except errors.SongError as exc:
+                        await self.ctx.send(f":x: Skipping `{self.now.title}` because I couldn't download it: {exc}")
+                        self.now = None
+                        continue
+
                 if not self.voice.is_connected():
                     # We aren't connected, so wait until we are
                     log.info("Waiting until we are connected to play music in %s", self)
@@ -232,14 +292,16 @@ class Player:
                 self.song_started = time.time()
 
                 query = """UPDATE songs
-                           SET plays = plays + 1
+                           SET plays = plays + 1, last_played_at=$2
                            WHERE songs.id=$1;
                         """
-                await self.ctx.bot.db.execute(query, self.now.id)
+                await self.ctx.bot.db.execute(query, self.now.id, datetime.datetime.utcnow())
 
                 if self.notifications:
                     await self.ctx.send(f":notes: Now playing `{self.now.title}`")
 
+                self.prefetch()
+
                 # Wait till the song is over and then resume the loop
                 log.info("Waiting for song to finish in %s", self)
                 await self._event.wait()
@@ -271,6 +333,36 @@ class Player:
                 self.bot.players.pop(self.guild.id)
             return
 
+    def prefetch(self):
+        """Starts downloading the next few songs in the queue that aren't on disk yet."""
+
+        for song in self.queue[:self.PREFETCH_COUNT]:
+            if song not in self._prefetching and not song.is_downloaded:
+                self._prefetching[song] = self.bot.loop.create_task(self.download(song))
+
+    async def download(self, song):
+        task = self._prefetching.get(song)
+        prefetching = task is not None and task is asyncio.current_task(loop=self.bot.loop)
+
+        if task and not prefetching:
+            # Wait for the prefetch that's already running, and only try again if it failed
+            await asyncio.shield(task)
+            if song.is_downloaded:
+                return
+
+        try:
+            # Limit downloads per guild and across every guild, so one long queue can't hog them
+            async with self.bot.get_cog("Music").prefetch_semaphore, self._prefetch_semaphore:
+                if not song.is_downloaded:
+                    await song.download(self.ctx)
+        except errors.SongError as exc:
+            if not prefetching:
+                raise
+            log.info("Couldn't prefetch song in %s", self, exc_info=exc)
+        finally:
+            if prefetching:
+                self._prefetching.pop(song, None)
+
     def after_song(self, exc):
         if not exc:
             self._event.set()
@@ -303,6 +395,10 @@ class Player:
         self.voice.stop()
         self.now = None
 
+        for task in self._prefetching.values():
+            task.cancel()
+        self._prefetching.clear()
+
     async def cleanup(self):
         log.info("Canceling player loop for %s", self)
         self.loop.cancel()
@@ -326,7 +422,7 @@ class Song:
                  "title", "thumbnail", "description", "duration", "timestamp_duration",
                  "tags", "url", "views", "likes", "dislikes",
                  "stream_url", "id", "plays", "created_at",
-                 "updated_at")
+                 "updated_at", "filesize", "evicted")
 
     FFMPEG_OPTIONS = {
         "options": "-vn"
@@ -347,7 +443,8 @@ class Song:
         "default_search": "auto",
         "source_address": "0.0.0.0",
     }
-    ytdl = youtube_dl.YoutubeDL(YTDL_OPTIONS)
+    _ytdl = None
+    _flat_ytdl = None
 
     def __init__(self, ctx, *, data, filename=None):
         self._data = data
@@ -377,6 +474,47 @@ class Song:
         self.plays = None
         self.created_at = None
         self.updated_at = None
+        self.filesize = None
+        self.evicted = False
+
+    @classmethod
+    def get_flat_ytdl(cls):
+        # Lists the entries in a playlist without resolving each one
+        if not cls._flat_ytdl:
+            import youtube_dl
+            cls._flat_ytdl = youtube_dl.YoutubeDL({**cls.YTDL_OPTIONS, "extract_flat": "in_playlist"})
+        return cls._flat_ytdl
+
+    @classmethod
+    def get_ytdl(cls):
+        if not cls._ytdl:
+            import youtube_dl
+            cls._ytdl = youtube_dl.YoutubeDL(cls.YTDL_OPTIONS)
+        return cls._ytdl
+
+    @property
+    def is_downloaded(self):
+        return bool(self.filename) and not self.evicted and os.path.exists(self.filename)
+
+    async def download(self, ctx):
+        """Downloads the song if it isn't on disk, because it was queued before it was downloaded or it was evicted from the cache."""
+
+        if self.id is None:
+            # Only resolved so far, so it isn't in the database yet either
+            song = await self.save(ctx, self.url, self)
+            self.id = song.id
+        else:
+            log.info("Downloading evicted song %s again", self.id)
+            song = await self.download_song(ctx, self)
+            query = """UPDATE songs
+                       SET filename=$1, evicted=FALSE
+                       WHERE songs.id=$2;
+                    """
+            await ctx.bot.db.execute(query, song.filename, self.id)
+            await ctx.bot.get_cog("Music").song_cache.add(self.id, song.filename)
+
+        self.filename = song.filename
+        self.evicted = False
 
     def source(self, volume, **options):
         options = {**self.FFMPEG_OPTIONS, **options}
@@ -395,9 +533,15 @@ class Song:
         return em
 
     @classmethod
-    async def from_query(cls, ctx, search):
+    async def from_query(cls, ctx, search, *, download=True):
+        """Gets a song from the database or youtube_dl.
+
+        Without download, a song that isn't on disk is returned as soon as it's resolved, and
+        downloading it is left to the player, which does so while the songs before it play.
+        """
+
         # Check if the search and result is already cached in the database
-        possible_song = await cls.from_alias(ctx, search)
+        possible_song = await cls.from_alias(ctx, search, download=download)
         if possible_song:
             return possible_song
 
@@ -410,7 +554,7 @@ class Song:
         record = await ctx.bot.db.fetchrow(query, search, youtube_id)
         if record:
             await cls.create_alias(ctx, search, record["id"])
-            return cls.from_record(record, ctx)
+            return await cls.from_cached_record(ctx, record, download=download)
 
         # Resolve the query into a full Song, so we can search the database
         song = await cls.resolve_query(ctx, search)
@@ -421,29 +565,65 @@ class Song:
         record = await ctx.bot.db.fetchrow(query, song.title, song.id, song.extractor)
         if record:
             await cls.create_alias(ctx, search, record["id"])
-            return cls.from_record(record, ctx)
+            return await cls.from_cached_record(ctx, record, download=download)
 
         # We shouldn't get here unless the song isn't in the database
+        if not download:
+            return song
+        return await cls.save(ctx, search, song)
+
+    @classmethod
+    async def save(cls, ctx, search, song):
+        """Downloads a resolved song, then caches it and the search that found it in the database."""
+
         song = await cls.download_song(ctx, song)
         data = song._data
 
-        # Cache the song and search in the database
+        # The same song can be downloaded for two searches at once, so the second one just updates the first
         query = """INSERT INTO songs (song_id, title, filename, extractor, plays, data)
                    VALUES ($1, $2, $3, $4, $5, $6)
+                   ON CONFLICT (song_id, extractor) DO UPDATE
+                   SET filename=EXCLUDED.filename, evicted=FALSE
                    RETURNING id;
                 """
         value = await ctx.bot.db.fetchval(query, song.song_id, song.title, song.filename, song.extractor, 0, data)
         await cls.create_alias(ctx, search, value)
+        await ctx.bot.get_cog("Music").song_cache.add(value, song.filename)
 
-        return cls(ctx, data=data, filename=song.filename)
+        song = cls(ctx, data=data, filename=song.filename)
+        song.id = value
+        return song
+
+    @classmethod
+    async def from_cached_record(cls, ctx, record, *, download=True):
+        """Creates a song from a database record, downloading it again if it was evicted from the cache."""
+
+        song = cls.from_record(record, ctx)
+        if song.evicted and download:
+            await song.download(ctx)
+        return song
+
+    @classmethod
+    async def extract(cls, ctx, search, *, download, flat=False, timeout):
+        """Runs youtube_dl in the Music cog's worker processes, so it can't hold up the event loop."""
+
+        pool = ctx.bot.get_cog("Music").ytdl_pool
+        try:
+            return await pool.run(run_ytdl, search, download=download, flat=flat, timeout=timeout)
+        except workers.JobError as exc:
+            if exc.name == "DownloadError":
+                raise errors.SongError(exc.message) from exc
+            log.error("youtube_dl failed while getting %s:\n%s", search, exc.traceback)
+            raise errors.SongError(f"Something went wrong with youtube_dl while getting `{search}`") from exc
+        except workers.WorkerError as exc:
+            raise errors.SongError(f"Something went wrong with youtube_dl while getting `{search}`") from exc
 
     @classmethod
     async def resolve_query(cls, ctx, search):
-        partial = functools.partial(cls.ytdl.extract_info, search, download=False)
         try:
-            info = await ctx.bot.loop.run_in_executor(None, partial)
-        except youtube_dl.DownloadError as exc:
-            raise errors.SongError(str(exc)) from exc
+            info = await cls.extract(ctx, search, download=False, timeout=60)
+        except asyncio.TimeoutError as exc:
+            raise errors.SongError(f"It took too long to find `{search}`") from exc
 
         if not info:
             raise errors.SongError(f"I couldn't resolve `{search}`")
@@ -452,15 +632,12 @@ class Song:
             if not entries:
                 raise errors.SongError(f"I Couldn't find any results for `{search}`")
             info = entries[0]
-        return cls(ctx, data=info, filename=cls.ytdl.prepare_filename(info))
+        return cls(ctx, data=info, filename=cls.get_ytdl().prepare_filename(info))
 
     @classmethod
     async def download_song(cls, ctx, song):
         try:
-            partial = functools.partial(cls.ytdl.extract_info, song.url)
-            info = await asyncio.wait_for(ctx.bot.loop.run_in_executor(None, partial), timeout=180, loop=ctx.bot.loop)
-        except youtube_dl.DownloadError as exc:
-            raise errors.SongError(str(exc)) from exc
+            info = await cls.extract(ctx, song.url, download=True, timeout=180)
         except asyncio.TimeoutError as exc:
             raise errors.SongError(f"It took too long to download `{song.url}") from exc
 
@@ -471,7 +648,7 @@ class Song:
             if not entries:
                 raise errors.SongError(f"I Couldn't find any results for `{search}`")
             info = entries[0]
-        return cls(ctx, data=info, filename=cls.ytdl.prepare_filename(info))
+        return cls(ctx, data=info, filename=cls.get_ytdl().prepare_filename(info))
 
     @classmethod
     async def from_database(cls, ctx, search):
@@ -512,12 +689,14 @@ class Song:
     @classmethod
     async def create_alias(cls, ctx, search, song_id):
         query = """INSERT INTO song_searches (search, song_id, expires_at)
-                   VALUES ($1, $2, $3);
+                   VALUES ($1, $2, $3)
+                   ON CONFLICT (search) DO UPDATE
+                   SET song_id=EXCLUDED.song_id, expires_at=EXCLUDED.expires_at;
                 """
         await ctx.bot.db.execute(query, search, song_id, datetime.datetime.utcnow()+datetime.timedelta(days=30))
 
     @classmethod
-    async def from_alias(cls, ctx, search):
+    async def from_alias(cls, ctx, search, *, download=True):
         query = """SELECT *
                    FROM song_searches
                    INNER JOIN songs ON song_searches.song_id=songs.id
@@ -526,7 +705,7 @@ class Song:
         record = await ctx.bot.db.fetchrow(query, search)
         if record:
             if datetime.datetime.utcnow() < record["expires_at"]:
-                return cls.from_record(record, ctx)
+                return await cls.from_cached_record(ctx, record, download=download)
             else:
                 await cls.delete_alias(ctx, search)
 
@@ -540,11 +719,8 @@ class Song:
     @classmethod
     async def playlist(cls, ctx, search, *, download=True):
         # Extract the songs
-        partial = functools.partial(cls.ytdl.extract_info, search, download=download)
         try:
-            info = await asyncio.wait_for(ctx.bot.loop.run_in_executor(None, partial), timeout=180, loop=ctx.bot.loop)
-        except youtube_dl.DownloadError as exc:
-            raise errors.SongError(str(exc)) from exc
+            info = await cls.extract(ctx, search, download=download, timeout=180)
         except asyncio.TimeoutError as exc:
             raise errors.SongError("It took to long to download that playlist")
         if not info:
@@ -555,13 +731,40 @@ class Song:
         # Turn each item into a song
         songs = []
         for data in info["entries"]:
-            song = Song(ctx, data=data, filename=cls.ytdl.prepare_filename(data))
+            song = Song(ctx, data=data, filename=cls.get_ytdl().prepare_filename(data))
             songs.append(song)
 
         if not songs:
             raise errors.SongError("Playlist is empty")
         return songs
 
+    @classmethod
+    async def playlist_entries(cls, ctx, search):
+        """Gets the URL of every entry in a playlist without resolving or downloading any of them."""
+
+        try:
+            info = await cls.extract(ctx, search, download=False, flat=True, timeout=60)
+        except asyncio.TimeoutError as exc:
+            raise errors.SongError("It took to long to get that playlist") from exc
+        if not info:
+            raise errors.SongError(f"Couldn't find anything that matches `{search}`")
+        if "entries" not in info:
+            raise errors.SongError(f"No entries for `{search}`")
+
+        urls = []
+        for entry in info["entries"]:
+            if not entry:
+                continue
+            # Flat YouTube entries only have the video ID as their URL
+            if entry.get("ie_key") == "Youtube":
+                urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
+            else:
+                urls.append(entry.get("webpage_url") or entry.get("url"))
+
+        if not urls:
+            raise errors.SongError("Playlist is empty")
+        return urls
+
     @classmethod
     def from_record(cls, record, ctx):
         self = cls(ctx, data=record["data"], filename=record["filename"])
@@ -570,6 +773,8 @@ class Song:
         self.plays = record["plays"]
         self.created_at = record["created_at"]
         self.updated_at = record["updated_at"]
+        self.filesize = record.get("filesize")
+        self.evicted = record.get("evicted", False)
 
         return self
 
@@ -620,6 +825,14 @@ class Song:
         return ":".join([str(x) for x in duration])
 
 class Queue(asyncio.Queue):
+    # Called whenever a song is added, so the player can prefetch it
+    on_put = None
+
+    def _put(self, item):
+        super()._put(item)
+        if self.on_put:
+            self.on_put()
+
     def __getitem__(self, key):
         if isinstance(key, slice):
             return list(itertools.islice(self._queue, key.start, key.stop, key.step))
@@ -690,14 +903,208 @@ class PossibleURL(commands.Converter):
     async def convert(self, ctx, arg):
         return arg.strip("<>")
 
+class SongCache:
+    """Keeps the downloaded songs within a disk budget.
+
+    Each song's size is stored in the songs table, so the total is a single query. When
+    the total goes over the budget, the songs with the lowest score are deleted from disk
+    and marked as evicted. Songs score higher the more they're played, the more recently
+    they were played and the smaller they are. Evicted songs are downloaded again the
+    next time they're requested.
+    """
+
+    def __init__(self, bot, *, max_size):
+        self.bot = bot
+        self.max_size = max_size
+        self.lock = asyncio.Lock(loop=bot.loop)
+
+    def in_use(self):
+        # Songs that are playing or queued can't be evicted
+        filenames = set()
+        for player in self.bot.players.values():
+            if player.now:
+                filenames.add(player.now.filename)
+            filenames.update(song.filename for song in player.queue)
+        return filenames
+
+    async def size(self):
+        query = """SELECT COALESCE(SUM(songs.filesize), 0)
+                   FROM songs
+                   WHERE NOT songs.evicted;
+                """
+        return await self.bot.db.fetchval(query)
+
+    async def add(self, song_id, filename):
+        """Records the size of a song that was just downloaded, then evicts songs if needed."""
+
+        try:
+            size = await self.bot.loop.run_in_executor(None, os.path.getsize, filename)
+        except OSError:
+            size = None
+
+        query = """UPDATE songs
+                   SET filesize=$1
+                   WHERE songs.id=$2;
+                """
+        await self.bot.db.execute(query, size, song_id)
+
+        # The song is about to be queued, so don't evict it before that happens
+        await self.enforce(keep={filename})
+
+    async def backfill(self):
+        """Records the sizes of songs downloaded before sizes were tracked."""
+
+        # The extension is loaded before the database pool is created
+        await self.bot.wait_until_ready()
+
+        query = """SELECT id, filename
+                   FROM songs
+                   WHERE songs.filesize IS NULL AND NOT songs.evicted;
+                """
+        records = await self.bot.db.fetch(query)
+        if not records:
+            return
+
+        def get_sizes():
+            sizes = []
+            for record in records:
+                try:
+                    sizes.append((record["id"], os.path.getsize(record["filename"]), False))
+                except OSError:
+                    # The file is already gone, so treat it as evicted
+                    sizes.append((record["id"], None, True))
+            return sizes
+
+        sizes = await self.bot.loop.run_in_executor(None, get_sizes)
+        query = """UPDATE songs
+                   SET filesize=$2, evicted=$3
+                   WHERE songs.id=$1;
+                """
+        await self.bot.db.executemany(query, sizes)
+        log.info("Recorded the size of %s songs", len(sizes))
+
+        await self.enforce()
+
+    async def enforce(self, *, keep=()):
+        """Evicts songs until the cache is within its budget."""
+
+        async with self.lock:
+            total = await self.size()
+            if total <= self.max_size:
+                return
+
+            in_use = self.in_use() | set(keep)
+            query = """SELECT id, filename, filesize
+                       FROM songs
+                       WHERE NOT songs.evicted AND songs.filesize IS NOT NULL
+                       ORDER BY (songs.plays+1) / (
+                           (EXTRACT(EPOCH FROM (now() at time zone 'utc')-COALESCE(songs.last_played_at, songs.created_at)) / 86400 + 1)
+                           * (songs.filesize / 1048576.0 + 1)
+                       );
+                    """
+            evicted = []
+            async with self.bot.db.acquire() as connection:
+                async with connection.transaction():
+                    # Walk the songs lowest score first without loading them all at once
+                    async for record in connection.cursor(query):
+                        if total <= self.max_size:
+                            break
+                        if record["filename"] in in_use:
+                            continue
+                        evicted.append(record)
+                        total -= record["filesize"]
+
+            if not evicted:
+                log.warning("Song cache is over budget, but every song in it is in use")
+                return
+
+            def remove_files():
+                for record in evicted:
+                    try:
+                        os.remove(record["filename"])
+                    except FileNotFoundError:
+                        pass
+
+            await self.bot.loop.run_in_executor(None, remove_files)
+            query = """UPDATE songs
+                       SET evicted=TRUE
+                       WHERE songs.id=ANY($1::INT[]);
+                    """
+            await self.bot.db.execute(query, [record["id"] for record in evicted])
+            log.info("Evicted %s songs from the cache, which is now %s", len(evicted), humanize.naturalsize(total, binary=True))
+
 class Music(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.emoji = ":notes:"
 
+        self.song_cache = SongCache(bot, max_size=getattr(bot.config, "song_cache_size", 10*1024**3))
+        self.prefetch_semaphore = asyncio.Semaphore(getattr(bot.config, "prefetch_concurrency", 4), loop=bot.loop)
+        self.ytdl_pool = workers.ProcessPool(getattr(bot.config, "ytdl_workers", 2), loop=bot.loop, name="youtube_dl")
+        self.bot.loop.create_task(self.song_cache.backfill())
+
+    def cog_unload(self):
+        self.ytdl_pool.close()
+
     def cog_check(self, ctx):
         return ctx.guild
 
+    async def enqueue_all(self, ctx, urls, *, name, resolve=None):
+        """Resolves songs a few at a time, queueing each one in order as soon as it's ready.
+
+        Songs aren't downloaded here. The player downloads them just before they're needed.
+        """
+
+        player = ctx.player
+        message = await ctx.send(f":globe_with_meridians: Adding {name} (0/{len(urls)})")
+        last_edit = time.monotonic()
+
+        failed = []
+        resolve = resolve or functools.partial(Song.from_query, ctx, download=False)
+        concurrency = getattr(self.bot.config, "playlist_concurrency", 3)
+
+        # Repeated entries share one resolution, since resolving the same URL twice at once would insert it twice
+        resolving = {}
+
+        async def resolve_once(url):
+            if url not in resolving:
+                resolving[url] = asyncio.ensure_future(resolve(url))
+            return await asyncio.shield(resolving[url])
+
+        results = resolve_in_order(resolve_once, urls, concurrency=concurrency)
+        try:
+            async with ctx.typing():
+                position = 0
+                async for url, song, exc in results:
+                    position += 1
+                    if self.bot.players.get(ctx.guild.id) is not player:
+                        # The player was stopped while we were resolving
+                        return
+
+                    if exc:
+                        log.info("Couldn't resolve %s entry %s in %s", name, url, player, exc_info=exc)
+                        failed.append((position, url, exc))
+                    else:
+                        await player.queue.put(song)
+
+                    # Editing every entry would hit rate limits on long playlists
+                    if time.monotonic()-last_edit > 5:
+                        await message.edit(content=f":globe_with_meridians: Adding {name} ({position}/{len(urls)})")
+                        last_edit = time.monotonic()
+        finally:
+            # Cancel anything that's still resolving if we stopped early
+            await results.aclose()
+            for future in resolving.values():
+                future.cancel()
+
+        content = f":white_check_mark: Finished adding {name} ({len(urls)-len(failed)}/{len(urls)})"
+        if failed:
+            content += "\n:x: I couldn't find:"
+            content += "".join(f"\n{position}. <{url}> ({str(exc)[:100]})" for position, url, exc in failed[:10])
+            if len(failed) > 10:
+                content += f"\n...and {len(failed)-10} more"
+        await message.edit(content=content)
+
     @commands.command(name="connect", description="Connect the bot to a voice channel", aliases=["join"])
     async def connect(self, ctx):
         try:
@@ -797,17 +1204,12 @@ class Music(commands.Cog):
         await ctx.send(f":mag: Searching for `{query}`")
 
         if "list=" in query:
-            await ctx.send(":globe_with_meridians: Downloading playlist")
-
             async with ctx.typing():
-                songs = await Song.playlist(ctx, query)
-                for song in songs:
-                    await ctx.player.queue.put(song)
-
-            await ctx.send(f":white_check_mark: Finished downloading playlist")
+                urls = await Song.playlist_entries(ctx, query)
+            await self.enqueue_all(ctx, urls, name="playlist")
         else:
             async with ctx.typing():
-                song = await Song.from_query(ctx, query)
+                song = await Song.from_query(ctx, query, download=False)
 
             if ctx.player.is_playing:
                 await ctx.send(f":page_facing_up: Enqueued `{song.title}`")
@@ -821,18 +1223,30 @@ class Music(commands.Cog):
         if ctx.author not in ctx.player.channel.members:
             return
 
-        await ctx.send(":globe_with_meridians: Downloading bin")
+        try:
+            lines = await self.get_bin(url=url)
+        except:
+            return await ctx.send(":x: I couldn't fetch that bin. Make sure the URL is valid.")
 
-        async with ctx.typing():
-            try:
-                songs = await self.get_bin(url=url)
-            except:
-                return await ctx.send(":x: I couldn't fetch that bin. Make sure the URL is valid.")
-            for url in songs:
-                song = await Song.from_query(ctx, url)
-                await ctx.player.queue.put(song)
+        urls = [line.strip().strip("<>") for line in lines if line.strip()]
+        if not urls:
+            return await ctx.send(":x: That bin is empty")
+
+        # Look up every line we've already cached in one query, so those skip youtube_dl entirely
+        query = """SELECT song_searches.search, songs.*
+                   FROM song_searches
+                   INNER JOIN songs ON song_searches.song_id=songs.id
+                   WHERE song_searches.search=ANY($1::TEXT[]) AND song_searches.expires_at > $2;
+                """
+        records = await self.bot.db.fetch(query, list(set(urls)), datetime.datetime.utcnow())
+        cached = {record["search"]: record for record in records}
+
+        async def resolve(url):
+            if url in cached:
+                return await Song.from_cached_record(ctx, cached[url], download=False)
+            return await Song.from_query(ctx, url, download=False)
 
-        await ctx.send(f":white_check_mark: Finished downloading bin")
+        await self.enqueue_all(ctx, urls, name="bin", resolve=resolve)
 
     @commands.command(name="search", description="Search for a song on youtube")
     async def search(self, ctx, *, query):
@@ -848,7 +1262,7 @@ class Music(commands.Cog):
         if not song:
             return await ctx.send("Aborting")
 
-        song = await Song.from_query(ctx, song.url)
+        song = await Song.from_query(ctx, song.url, download=False)
 
         if ctx.player.is_playing:
             await ctx.send(f":page_facing_up: Enqueued `{song.title}`")
@@ -1111,12 +1525,12 @@ class Music(commands.Cog):
         play_count = sum([song.plays for song in songs])
         music_legnth = sum([song.total_seconds for song in songs])
         music_played = sum([song.total_seconds*song.plays for song in songs])
-        music_cache_size = sum([os.path.getsize(song.filename) for song in songs])
+        music_cache_size = await self.song_cache.size()
 
         em = discord.Embed(title="Music Stats", color=0x96c8da)
         em.add_field(name="Song Count", value=song_count)
         em.add_field(name="Play Count", value=play_count)
-        em.add_field(name="Music Cache Size", value=humanize.naturalsize(music_cache_size, binary=True))
+        em.add_field(name="Music Cache Size", value=f"{humanize.naturalsize(music_cache_size, binary=True)}/{humanize.naturalsize(self.song_cache.max_size, binary=True)}")
         em.add_field(name="Music Legnth", value=Song.parse_duration(music_legnth))
         em.add_field(name="Music Played", value=Song.parse_duration(music_played))
         await ctx.send(embed=em)
@@ -1166,7 +1580,7 @@ class Music(commands.Cog):
         em.add_field(name="Uploader", value=f"[{song.uploader}]({song.uploader_url})")
         em.add_field(name="Song ID", value=song.song_id)
         em.add_field(name="Extractor", value=song.extractor)
-        em.add_field(name="Size", value=humanize.naturalsize(os.path.getsize(song.filename), binary=True))
+        em.add_field(name="Size", value="Evicted" if song.evicted else humanize.naturalsize(song.filesize or 0, binary=True))
         em.add_field(name="Filename", value=discord.utils.escape_markdown(song.filename))
         em.add_field(name="Plays", value=song.plays)
         em.add_field(name="ID", value=song.id)
@@ -1184,10 +1598,11 @@ class Music(commands.Cog):
             song = await Song.resolve_query(ctx, song.url)
             song = await Song.download_song(ctx, song)
             query = """UPDATE songs
-                       SET title=$1, filename=$2, data=$3, updated_at=$4
+                       SET title=$1, filename=$2, data=$3, updated_at=$4, evicted=FALSE
                        WHERE songs.id=$5;
                     """
             await self.bot.db.execute(query, song.title, song.filename, song._data, datetime.datetime.utcnow(), song_id)
+            await self.song_cache.add(song_id, song.filename)
 
         await ctx.send(f":white_check_mark: `{song.title}` has been updated")
 
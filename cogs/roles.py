@@ -31,7 +31,7 @@ class Roles(commands.Cog):
         except asyncpg.UniqueViolationError:
             return await ctx.send(":x: This role is already in the autorole list")
 
-        self.get_autoroles.invalidate(role.guild.id)
+        await self.get_autoroles.broadcast(role.guild.id)
 
         await ctx.send(":white_check_mark: Added role to autorole list")
 
@@ -47,11 +47,11 @@ class Roles(commands.Cog):
         if result == "DELETE 0":
             return await ctx.send(":x: That role is not in the autorole list")
 
-        self.get_autoroles.invalidate(role.guild.id)
+        await self.get_autoroles.broadcast(role.guild.id)
 
         await ctx.send(":white_check_mark: Removed role from autorole list")
 
-    @cache.cache()
+    @cache.cache(key={"guild": cache.attribute("id")})
     async def get_autoroles(self, guild):
         query = """SELECT *
                    FROM autoroles
@@ -67,7 +67,7 @@ class Roles(commands.Cog):
                        WHERE autoroles.role_id=$1;
                     """
             await self.bot.db.execute(query, role.id)
-            self.get_autoroles.invalidate(role.guild.id)
+            await self.get_autoroles.broadcast(role.guild.id)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
@@ -1,34 +1,148 @@
 import asyncio
+import collections
 import datetime
+import heapq
+import json
+import logging
+import uuid
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, menus
 
 from .utils import human_time
 
+log = logging.getLogger("robo_coder.timers")
+
 class Timer:
-    __slots__ = ("bot", "id", "event", "data", "expires_at", "created_at")
+    __slots__ = ("bot", "id", "event", "guild_id", "channel_id", "user_id", "data", "recurrence", "expires_at", "created_at")
 
     def __init__(self, bot, **kwargs):
         self.bot = bot
         self.id = kwargs.get("id")
         self.event = kwargs.get("event")
-        self.data = kwargs.get("data")
+        self.guild_id = kwargs.get("guild_id")
+        self.channel_id = kwargs.get("channel_id")
+        self.user_id = kwargs.get("user_id")
+        self.data = kwargs.get("data") or {}
+        self.recurrence = kwargs.get("recurrence")
         self.expires_at = kwargs.get("expires_at")
         self.created_at = kwargs.get("created_at")
 
+class ReminderPages(menus.PageSource):
+    """Pages through a user's reminders, fetching each page with a keyset query when it's shown.
+
+    Each page starts after the (expires_at, id) of the last reminder on the page before it,
+    so every page costs the same no matter how many reminders come before it.
+    """
+
+    def __init__(self, bot, user, *, channel=None, per_page=10):
+        self.bot = bot
+        self.user = user
+        self.channel = channel
+        self.per_page = per_page
+
+        # cursors[n] is the (expires_at, id) that page n starts after
+        self.cursors = [None]
+        self.pages = {}
+
+    async def fetch(self, cursor):
+        conditions = ["timers.event = 'reminder'", "timers.user_id = $1"]
+        args = [self.user.id]
+        if self.channel:
+            args.append(self.channel.id)
+            conditions.append(f"timers.channel_id = ${len(args)}")
+        if cursor:
+            args.extend(cursor)
+            conditions.append(f"(timers.expires_at, timers.id) > (${len(args)-1}, ${len(args)})")
+
+        # Fetch one extra row to find out if there's another page
+        query = f"""SELECT * FROM timers
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY timers.expires_at, timers.id
+                    LIMIT {self.per_page+1};
+                 """
+        records = await self.bot.db.fetch(query, *args)
+        return [Timer(self.bot, **dict(record)) for record in records]
+
+    async def get_page(self, page_number):
+        if page_number in self.pages:
+            return self.pages[page_number]
+        if page_number >= len(self.cursors):
+            # Pages can only be reached from the one before them
+            raise IndexError(page_number)
+
+        timers = await self.fetch(self.cursors[page_number])
+        if not timers and page_number:
+            raise IndexError(page_number)
+
+        if len(timers) > self.per_page:
+            timers = timers[:self.per_page]
+            if page_number+1 == len(self.cursors):
+                self.cursors.append((timers[-1].expires_at, timers[-1].id))
+
+        self.pages[page_number] = timers
+        return timers
+
+    def is_paginating(self):
+        return len(self.cursors) > 1
+
+    def get_max_pages(self):
+        # We don't know how many pages there are without counting every reminder
+        return None
+
+    async def format_page(self, menu, timers):
+        now = menu.ctx.message.created_at
+        title = "Reminders Here" if self.channel else "Reminders"
+
+        em = discord.Embed(title=title, description="\n", color=0x96c8da)
+        for timer in timers:
+            em.description += f"\n{discord.utils.escape_markdown(timer.data['content'])} `({timer.id})` in {human_time.timedelta(timer.expires_at, when=now)}"
+            if timer.recurrence:
+                em.description += f" (repeats {human_time.Recurrence.from_dict(timer.recurrence)})"
+
+        if self.is_paginating():
+            em.set_footer(text=f"Page {menu.current_page+1}")
+        return em
+
 class Timers(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.emoji = ":timer:"
 
+        # Timers due within the horizon are kept in a heap of [expires_at, id, timer] entries.
+        # Canceled entries have their timer set to None and are skipped when they reach the top.
+        self.horizon = datetime.timedelta(hours=1)
+        self.heap = []
+        self.entries = {}
+        self.loaded_until = None
+        self.wakeup = asyncio.Event(loop=self.bot.loop)
+
+        # Due timers are leased to this process while they're dispatched, so several processes can run timers
+        self.owner = uuid.uuid4().hex
+        self.lease_duration = datetime.timedelta(minutes=5)
+
+        # Timers are claimed in batches, and no more are claimed while a batch's worth is still being dispatched
+        self.max_claim = 500
+        self.dispatching = set()
+
+        # Limits how many timer handlers run at once when a lot of timers expire together
+        self.dispatch_semaphore = asyncio.Semaphore(25, loop=self.bot.loop)
+
+        # New timers are buffered for a moment and inserted together, so bursts only cost one query
+        self.insert_buffer = []
+        self.insert_delay = 0.05
+        self.max_insert_batch = 500
+        self._insert_handle = None
+
+        # Dedicated connection that listens for timers created or deleted by any process
+        self.connection = None
+
         self.loop = self.bot.loop.create_task(self.run_timers())
-        self.current_timer = None
-        self.timers_pending = asyncio.Event(loop=self.bot.loop)
-        self.timers_pending.set()
 
     def cog_unload(self):
         self.loop.cancel()
+        self.bot.loop.create_task(self.flush_inserts())
+        self.bot.loop.create_task(self.stop_listening())
 
     @commands.group(name="remind", description="Set a reminder", aliases=["timer", "reminder"], invoke_without_command=True)
     async def remind(self, ctx, *, reminder: human_time.TimeWithContent):
@@ -36,56 +150,48 @@ class Timers(commands.Cog):
         expires_at = reminder.time
         created_at = ctx.message.created_at
 
-        await self.create_timer("reminder", [ctx.author.id, ctx.channel.id, ctx.message.jump_url, content], expires_at, created_at)
+        await self.create_timer("reminder", expires_at, created_at, guild_id=ctx.guild.id if ctx.guild else None, channel_id=ctx.channel.id, user_id=ctx.author.id, data={"jump_url": ctx.message.jump_url, "content": content})
         await ctx.send(f"Set a reminder for `{human_time.timedelta(expires_at, when=created_at)}` with the message: `{content}`.")
 
+    @remind.command(name="every", description="Set a reminder that repeats", usage="<interval> [reminder]")
+    async def remind_every(self, ctx, *, reminder: human_time.RecurrenceWithContent):
+        content = reminder.content
+        expires_at = reminder.time
+        created_at = ctx.message.created_at
+
+        await self.create_timer("reminder", expires_at, created_at, guild_id=ctx.guild.id if ctx.guild else None, channel_id=ctx.channel.id, user_id=ctx.author.id, data={"jump_url": ctx.message.jump_url, "content": content}, recurrence=reminder.recurrence.to_dict())
+        await ctx.send(f"Set a reminder `{reminder.recurrence}` starting in `{human_time.timedelta(expires_at, when=created_at)}` with the message: `{content}`.")
+
     @remind.command(name="list", description="List your reminders")
     async def remind_list(self, ctx):
-        query = """SELECT * FROM timers
-                   WHERE event = 'reminder'
-                   AND data #>> '{0}' = $1;
-                """
-        timers = await self.bot.db.fetch(query, str(ctx.author.id))
-        timers = [Timer(self.bot, **dict(timer)) for timer in timers]
-        if not timers:
+        source = ReminderPages(self.bot, ctx.author)
+        if not await source.get_page(0):
             return await ctx.send("You don't have any reminders.")
 
-        em = discord.Embed(title="Reminders", description="\n", color=0x96c8da)
-        for timer in timers:
-            em.description += f"\n{discord.utils.escape_markdown(timer.data[3])} `({timer.id})` in {human_time.timedelta(timer.expires_at, when=ctx.message.created_at)}"
-        await ctx.send(embed=em)
+        pages = menus.MenuPages(source, clear_reactions_after=True)
+        await pages.start(ctx)
 
     @remind.command(name="here", description="List your reminders in this channel")
     async def remind_here(self, ctx):
-        query = """SELECT * FROM timers
-                   WHERE event = 'reminder'
-                   AND data #>> '{0}' = $1
-                   AND data #>> '{1}' = $2;
-                """
-        timers = await self.bot.db.fetch(query, str(ctx.author.id), str(ctx.channel.id))
-        timers = [Timer(self.bot, **dict(timer)) for timer in timers]
-
-        if not timers:
+        source = ReminderPages(self.bot, ctx.author, channel=ctx.channel)
+        if not await source.get_page(0):
             return await ctx.send("You don't have any reminders in this channel.")
 
-        em = discord.Embed(title="Reminders Here", description="\n", color=0x96c8da)
-        for timer in timers:
-            em.description += f"\n{discord.utils.escape_markdown(timer.data[3])} `({timer.id})` in {human_time.timedelta(timer.expires_at, when=timer.created_at)}"
-        await ctx.send(embed=em)
+        pages = menus.MenuPages(source, clear_reactions_after=True)
+        await pages.start(ctx)
 
     @remind.command(name="cancel", description="Cancel a reminder", aliases=["delete", "remove"])
     async def remind_cancel(self, ctx, timer: int):
         query = """DELETE FROM timers
                    WHERE
-                   timers.event=$1 AND timers.id=$2;
+                   timers.event=$1 AND timers.id=$2
+                   RETURNING id;
                 """
-        result = await self.bot.db.execute(query, "reminder", timer)
-        if result == "DELETE 0":
+        timer_id = await self.bot.db.fetchval(query, "reminder", timer)
+        if not timer_id:
             return await ctx.send("Couldn't find this reminder in your reminder list.")
 
-        if self.current_timer and self.current_timer.event == "reminder" and self.current_timer.id == timer:
-            # The timer running is the one we canceled, so we need to restart the loop
-            self.restart_loop()
+        self.cancel_timer(timer_id)
 
         await ctx.send("Reminder has been canceled.")
 
@@ -93,14 +199,15 @@ class Timers(commands.Cog):
     async def remind_clear(self, ctx):
         query = """DELETE FROM timers
                    WHERE event = 'reminder'
-                   AND data #>> '{0}' = $1;
+                   AND user_id = $1
+                   RETURNING id;
                 """
-        result = await self.bot.db.execute(query, str(ctx.author.id))
-        if result == "DELETE 0":
+        records = await self.bot.db.fetch(query, ctx.author.id)
+        if not records:
             return await ctx.send("No reminders to clear.")
 
-        if self.current_timer and self.current_timer.event == "reminder" and self.current_timer.data[0] == ctx.author.id:
-            self.restart_loop()
+        for record in records:
+            self.cancel_timer(record["id"])
 
         await ctx.send("All your reminders have been cleared.")
 
@@ -108,71 +215,349 @@ class Timers(commands.Cog):
     async def reminders(self, ctx):
         await ctx.invoke(self.remind_list)
 
-    async def create_timer(self, event, data, expires_at, created_at):
-        query = """INSERT INTO timers (event, data, expires_at, created_at)
-                   VALUES ($1, $2, $3, $4)
-                   RETURNING id;
-                """
-        value = await self.bot.db.fetchval(query, event, data, expires_at, created_at)
-        timer = Timer(self.bot, id=value, event=event, expires_at=expires_at, data=data, created_at=created_at)
-        if self.current_timer and timer.expires_at < self.current_timer.expires_at:
-            # Loop is currently sleeping for longer than the current timer so we need to cancel and re-run it
-            self.restart_loop()
+    async def create_timer(self, event, expires_at, created_at, *, guild_id=None, channel_id=None, user_id=None, data=None, recurrence=None):
+        timer = Timer(self.bot, event=event, guild_id=guild_id, channel_id=channel_id, user_id=user_id, data=data or {}, recurrence=recurrence, expires_at=expires_at, created_at=created_at)
+        future = self.bot.loop.create_future()
+        self.insert_buffer.append((timer, future))
 
-        self.timers_pending.set()
+        if len(self.insert_buffer) >= self.max_insert_batch:
+            self.bot.loop.create_task(self.flush_inserts())
+        elif self._insert_handle is None:
+            self._insert_handle = self.bot.loop.call_later(self.insert_delay, self._start_insert_flush)
+
+        timer.id = await future
         return timer
 
-    async def get_newest_timer(self):
-        query = """SELECT *
-                   FROM timers
-                   ORDER BY timers.expires_at
-                   LIMIT 1;
+    def _start_insert_flush(self):
+        self._insert_handle = None
+        self.bot.loop.create_task(self.flush_inserts())
+
+    async def flush_inserts(self):
+        """Inserts every buffered timer with one query and gives each caller its ID."""
+
+        if self._insert_handle:
+            self._insert_handle.cancel()
+            self._insert_handle = None
+
+        batch, self.insert_buffer = self.insert_buffer, []
+        if not batch:
+            return
+
+        timers = [timer for timer, _ in batch]
+        query = """INSERT INTO timers (event, guild_id, channel_id, user_id, data, recurrence, expires_at, created_at)
+                   SELECT event, guild_id, channel_id, user_id, data::jsonb, recurrence::jsonb, expires_at, created_at
+                   FROM unnest($1::TEXT[], $2::BIGINT[], $3::BIGINT[], $4::BIGINT[], $5::TEXT[], $6::TEXT[], $7::TIMESTAMP[], $8::TIMESTAMP[])
+                   WITH ORDINALITY AS new (event, guild_id, channel_id, user_id, data, recurrence, expires_at, created_at, position)
+                   ORDER BY position
+                   RETURNING id;
                 """
-        timer = await self.bot.db.fetchrow(query)
-        if timer:
-            return Timer(self.bot, **dict(timer))
+        try:
+            records = await self.bot.db.fetch(
+                query,
+                [timer.event for timer in timers],
+                [timer.guild_id for timer in timers],
+                [timer.channel_id for timer in timers],
+                [timer.user_id for timer in timers],
+                [json.dumps(timer.data) for timer in timers],
+                [json.dumps(timer.recurrence) if timer.recurrence else None for timer in timers],
+                [timer.expires_at for timer in timers],
+                [timer.created_at for timer in timers]
+            )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        # IDs come from a sequence, so they're handed out in the order the rows were inserted
+        for (timer, future), timer_id in zip(batch, sorted(record["id"] for record in records)):
+            timer.id = timer_id
+            if not future.done():
+                future.set_result(timer_id)
+
+            # Timers beyond the horizon stay in the database until the next refill picks them up
+            self.schedule_timer(timer)
+
+    def schedule_timer(self, timer, *, deadline=None):
+        deadline = deadline or timer.expires_at
+        if self.loaded_until is None or deadline > self.loaded_until or timer.id in self.entries:
+            return
+
+        entry = [deadline, timer.id, timer]
+        self.entries[timer.id] = entry
+        heapq.heappush(self.heap, entry)
+
+        if self.heap[0] is entry:
+            # This timer is due before the one the loop is sleeping for
+            self.wakeup.set()
+
+    def cancel_timer(self, timer_id):
+        entry = self.entries.pop(timer_id, None)
+        if entry:
+            entry[2] = None
+
+    async def load_timers(self):
+        """Loads the timers that are due within the horizon into the heap."""
+
+        start = self.loaded_until
+        until = datetime.datetime.utcnow()+self.horizon
+
+        # Move the horizon first so timers created while we query are scheduled by create_timer
+        self.loaded_until = until
+
+        if start:
+            query = """SELECT *
+                       FROM timers
+                       WHERE timers.expires_at > $1 AND timers.expires_at <= $2;
+                    """
+            records = await self.bot.db.fetch(query, start, until)
+        else:
+            query = """SELECT *
+                       FROM timers
+                       WHERE timers.expires_at <= $1;
+                    """
+            records = await self.bot.db.fetch(query, until)
+
+        for record in records:
+            self.schedule_timer(Timer(self.bot, **dict(record)))
+
+    async def start_listening(self):
+        self.connection = await self.bot.db.acquire()
+        await self.connection.add_listener("timers", self.on_timer_notification)
+        self.connection.add_termination_listener(self.on_listener_termination)
+
+    async def stop_listening(self):
+        connection, self.connection = self.connection, None
+        if connection and not connection.is_closed():
+            await connection.remove_listener("timers", self.on_timer_notification)
+            await self.bot.db.release(connection)
+
+    def on_timer_notification(self, connection, pid, channel, payload):
+        data = json.loads(payload)
+        timer_id = data["id"]
+
+        if data["op"] == "DELETE":
+            self.cancel_timer(timer_id)
+            return
+
+        expires_at = datetime.datetime.utcfromtimestamp(data["expires_at"])
+        entry = self.entries.get(timer_id)
+        if entry and entry[0] == expires_at:
+            return
+
+        # The claim returns the whole row, so the heap only needs to know the ID and when it's due
+        self.cancel_timer(timer_id)
+        self.schedule_timer(Timer(self.bot, id=timer_id, expires_at=expires_at))
+
+    def on_listener_termination(self, connection):
+        if self.connection is not connection:
+            return
+
+        # Notifications may have been missed, so reload everything once we're listening again
+        log.warning("Timer notification connection was closed. Reconnecting.")
+        self.connection = None
+        self.bot.loop.create_task(self.bot.db.release(connection))
+        self.loaded_until = None
+        self.wakeup.set()
 
     async def run_timers(self):
         await self.bot.wait_until_ready()
 
         while True:
-            # Check for new timers
-            await self.timers_pending.wait()
-            timer = await self.get_newest_timer()
-
-            if not timer:
-                # We don't have any timers, so wait for timers then get the timer
-                self.timers_pending.clear()
-                await self.timers_pending.wait()
-                timer = await self.get_newest_timer()
-
-            # Wait until the current timer is ready to be dispatched
-            self.current_timer = timer
-            time = timer.expires_at-datetime.datetime.utcnow()
-            if time.total_seconds():
-                await asyncio.sleep(time.total_seconds())
-
-            query = """DELETE FROM timers
-                       WHERE timers.id=$1;
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.error("Exception in timer loop. Retrying in 5 seconds.", exc_info=exc)
+                await asyncio.sleep(5)
+
+    async def run_once(self):
+        self.wakeup.clear()
+
+        if not self.connection:
+            await self.start_listening()
+
+        now = datetime.datetime.utcnow()
+
+        # Refill once we're halfway through the horizon
+        refill_at = self.loaded_until-self.horizon/2 if self.loaded_until else now
+        if refill_at <= now:
+            await self.load_timers()
+            return
+
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+
+        deadline = min(self.heap[0][0], refill_at) if self.heap else refill_at
+        delay = (deadline-now).total_seconds()
+        if delay > 0:
+            # Sleep until the deadline, or until an earlier timer is scheduled
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        # Leave the rest to other processes until some of what we've already claimed is done
+        limit = self.max_claim-len(self.dispatching)
+        if limit <= 0:
+            await self.wakeup.wait()
+            return
+
+        await self.claim_timers(now, limit=limit)
+
+    async def claim_timers(self, now, *, limit):
+        # Lease the oldest due timers that no other process holds in one round-trip.
+        # SKIP LOCKED lets processes claim at the same time without waiting on each other.
+        # Our own leases are never reclaimed, since those timers are still being dispatched.
+        query = """UPDATE timers
+                   SET lease_owner=$2, lease_expires_at=$3
+                   WHERE timers.id IN (
+                       SELECT id FROM timers
+                       WHERE timers.expires_at <= $1
+                       AND (timers.lease_expires_at IS NULL OR timers.lease_expires_at <= $1)
+                       AND timers.lease_owner IS DISTINCT FROM $2
+                       ORDER BY timers.expires_at
+                       LIMIT $4
+                       FOR UPDATE SKIP LOCKED
+                   )
+                   RETURNING *;
+                """
+        records = await self.bot.db.fetch(query, now, self.owner, now+self.lease_duration, limit)
+        claimed = {record["id"] for record in records}
+
+        for timer_id in claimed:
+            self.cancel_timer(timer_id)
+
+        timers = [Timer(self.bot, **dict(record)) for record in records]
+        if timers:
+            # Dispatch in the background so slow handlers don't hold up the next timers
+            self.dispatching.update(claimed)
+            self.bot.loop.create_task(self.dispatch_timers(timers))
+
+        # A full batch means there may be more due, so leave the rest of the heap to be claimed next time round
+        if len(records) >= limit:
+            return
+
+        recheck = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, timer_id, timer = heapq.heappop(self.heap)
+            self.entries.pop(timer_id, None)
+            if timer and deadline == timer.expires_at:
+                recheck.append(timer)
+
+        # Due timers we didn't get were deleted or are leased by another process. Check once more
+        # when that lease could have expired, in case its owner died. Any claim picks up expired
+        # leases whether or not they're in the heap, so there's no need to keep checking after that.
+        for timer in recheck:
+            self.schedule_timer(timer, deadline=now+self.lease_duration)
+
+    async def dispatch_timers(self, timers):
+        renewal = self.bot.loop.create_task(self.renew_leases(timers))
+        try:
+            await self._dispatch_timers(timers)
+        finally:
+            renewal.cancel()
+            self.dispatching.difference_update(timer.id for timer in timers)
+            self.wakeup.set()
+
+    async def renew_leases(self, timers):
+        # Keep a large batch leased to us for as long as it takes to dispatch
+        query = """UPDATE timers
+                   SET lease_expires_at=$3
+                   WHERE timers.id=ANY($1::INT[]) AND timers.lease_owner=$2;
+                """
+        ids = [timer.id for timer in timers]
+        while True:
+            await asyncio.sleep(self.lease_duration.total_seconds()/2)
+            try:
+                await self.bot.db.execute(query, ids, self.owner, datetime.datetime.utcnow()+self.lease_duration)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.warning("Failed to renew timer leases", exc_info=exc)
+
+    async def _dispatch_timers(self, timers):
+        reminders = collections.defaultdict(list)
+        others = []
+        for timer in timers:
+            if timer.event == "reminder":
+                reminders[timer.channel_id].append(timer)
+            else:
+                others.append(timer)
+
+        coros = [self.send_reminders(channel_id, channel_timers) for channel_id, channel_timers in reminders.items()]
+        coros.extend(self.call_timer(timer) for timer in others)
+        await asyncio.gather(*[self.run_bounded(coro) for coro in coros])
+
+        # Recurring timers are moved to their next occurrence instead of being deleted
+        recurring = [timer for timer in timers if timer.recurrence]
+        if recurring:
+            now = datetime.datetime.utcnow()
+            for timer in recurring:
+                timer.expires_at = human_time.Recurrence.from_dict(timer.recurrence).next_after(timer.expires_at, now=now)
+
+            query = """UPDATE timers
+                       SET expires_at=occurrences.expires_at, lease_owner=NULL, lease_expires_at=NULL
+                       FROM unnest($1::INT[], $2::TIMESTAMP[]) AS occurrences (id, expires_at)
+                       WHERE timers.id=occurrences.id AND timers.lease_owner=$3;
                     """
-            await self.bot.db.execute(query, timer.id)
-            self.bot.dispatch(f"{timer.event}_complete", timer)
+            await self.bot.db.execute(query, [timer.id for timer in recurring], [timer.expires_at for timer in recurring], self.owner)
 
-    def restart_loop(self):
-        self.loop.cancel()
-        self.loop = self.bot.loop.create_task(self.run_timers())
+            for timer in recurring:
+                self.schedule_timer(timer)
 
-    @commands.Cog.listener()
-    async def on_reminder_complete(self, timer):
-        created_at = timer.created_at
-        channel = self.bot.get_channel(timer.data[1])
-        user = self.bot.get_user(timer.data[0])
-        content = timer.data[3]
-        jump_url = timer.data[2]
-
-        em = discord.Embed(title=content, description=f"\n[Jump]({jump_url})", color=0x96c8da)
-        em.add_field(name="When", value=f"{human_time.timedelta(datetime.datetime.utcnow(), when=timer.created_at)} ago")
-        await channel.send(content=user.mention, embed=em)
+        # Only delete timers that are still leased to us, in case dispatching took longer than the lease
+        query = """DELETE FROM timers
+                   WHERE timers.id=ANY($1::INT[]) AND timers.lease_owner=$2;
+                """
+        await self.bot.db.execute(query, [timer.id for timer in timers if not timer.recurrence], self.owner)
+
+    async def run_bounded(self, coro):
+        async with self.dispatch_semaphore:
+            try:
+                await coro
+            except Exception as exc:
+                log.error("Exception in timer handler", exc_info=exc)
+
+    async def call_timer(self, timer):
+        # Call the listeners directly rather than through dispatch, so they count towards the semaphore
+        listeners = self.bot.extra_events.get(f"on_{timer.event}_complete", [])
+        await asyncio.gather(*[listener(timer) for listener in listeners])
+
+    async def send_reminders(self, channel_id, timers):
+        """Sends every reminder for a channel that expired in the same tick, merged into as few messages as possible."""
+
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            return
+
+        now = datetime.datetime.utcnow()
+        if len(timers) == 1:
+            timer = timers[0]
+            user = self.bot.get_user(timer.user_id)
+            em = discord.Embed(title=timer.data["content"], description=f"\n[Jump]({timer.data['jump_url']})", color=0x96c8da)
+            em.add_field(name="When", value=f"{human_time.timedelta(now, when=timer.created_at)} ago")
+            if timer.recurrence:
+                em.add_field(name="Repeats", value=str(human_time.Recurrence.from_dict(timer.recurrence)))
+            return await channel.send(content=user.mention if user else None, embed=em)
+
+        timers.sort(key=lambda timer: timer.created_at)
+        lines = [f"<@{timer.user_id}>: {discord.utils.escape_markdown(timer.data['content'])} ([Jump]({timer.data['jump_url']}), {human_time.timedelta(now, when=timer.created_at)} ago)" for timer in timers]
+
+        # Keep each message under the embed description and mention limits
+        pages = []
+        for timer, line in zip(timers, lines):
+            if not pages or len(pages[-1][1]) >= 20 or sum(len(line)+1 for line in pages[-1][1])+len(line) > 2000:
+                pages.append(([], []))
+            pages[-1][0].append(timer.user_id)
+            pages[-1][1].append(line)
+
+        for user_ids, lines in pages:
+            mentions = " ".join(f"<@{user_id}>" for user_id in dict.fromkeys(user_ids))
+            em = discord.Embed(title="Reminders", description="\n".join(lines), color=0x96c8da)
+            await channel.send(content=mentions, embed=em)
 
 def setup(bot):
     bot.add_cog(Timers(bot))
@@ -5,7 +5,6 @@ import unicodedata
 
 import discord
 from discord.ext import commands
-from PIL import Image
 
 from .utils import formats, human_time
 
@@ -309,6 +308,8 @@ class Tools(commands.Cog):
         await ctx.send(human_time.format_time(time))
 
     async def average_image_color(self, icon):
+        from PIL import Image
+
         data = await icon.read()
         image = io.BytesIO(data)
 
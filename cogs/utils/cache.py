@@ -2,48 +2,272 @@ import asyncio
 import collections
 import functools
 import inspect
+import json
+import logging
+import sys
+import time
+import uuid
 
-class LRUDict(collections.OrderedDict):
-    def __init__(self, max_legnth = 10, *args, **kwargs):
+log = logging.getLogger("robo_coder.cache")
+
+# All the functions decorated with cache, keyed by their qualified name
+caches = {}
+
+# Callbacks for invalidations of things that aren't cached functions, keyed by name
+handlers = {}
+
+# The listener used to broadcast invalidations to other processes, if one has been started
+listener = None
+
+class CacheStats:
+    __slots__ = ("hits", "misses", "evictions", "expirations", "coalesced")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    @property
+    def lookups(self):
+        return self.hits + self.misses
+
+    @property
+    def hit_ratio(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+class LRUDict:
+    """A least recently used mapping with an optional time to live and memory budget."""
+
+    __slots__ = ("max_legnth", "ttl", "max_bytes", "sizeof", "stats", "bytes", "_data")
+
+    def __init__(self, max_legnth=128, *, ttl=None, max_bytes=None, sizeof=sys.getsizeof):
         if max_legnth <= 0:
-            raise ValueError()
+            raise ValueError("max_legnth must be greater than 0")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("max_bytes must be greater than 0")
+
         self.max_legnth = max_legnth
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.stats = CacheStats()
+        self.bytes = 0
 
-        super().__init__(*args, **kwargs)
+        # Maps each key to a (value, expires_at, size) tuple, with the least recently used key first
+        self._data = collections.OrderedDict()
 
     def __setitem__(self, key, value):
-        super().__setitem__(key, value)
+        expires_at = time.monotonic()+self.ttl if self.ttl else None
+        size = self.sizeof(value) if self.max_bytes else 0
+
+        if key in self._data:
+            self.bytes -= self._data[key][2]
+            self._data.move_to_end(key)
+        self._data[key] = (value, expires_at, size)
+        self.bytes += size
 
-        if len(self) > 10:
-            super().__delitem__(list(self)[0])
+        # Popping from the front of an OrderedDict is O(1)
+        while len(self._data) > self.max_legnth or (self.max_bytes and self.bytes > self.max_bytes and len(self._data) > 1):
+            _, (_, _, size) = self._data.popitem(last=False)
+            self.bytes -= size
+            self.stats.evictions += 1
 
     def __getitem__(self, key):
-        value = super().__getitem__(key)
-        self.move_to_end(key)
+        try:
+            value, expires_at, size = self._data[key]
+        except KeyError:
+            self.stats.misses += 1
+            raise
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.bytes -= size
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            raise KeyError(key)
+
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def __delitem__(self, key):
+        _, _, size = self._data.pop(key)
+        self.bytes -= size
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        try:
+            value, _, size = self._data.pop(key)
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+
+        self.bytes -= size
         return value
 
-def cache(max_legnth = 128):
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+class attribute:
+    """A key extractor that uses an attribute of the argument, such as a guild's ID.
+
+    Arguments that don't have the attribute are used as is, so a function keyed
+    on ``guild.id`` can be invalidated with either the guild or its ID.
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, value):
+        return getattr(value, self.name, value)
+
+    def __repr__(self):
+        return f"<attribute name={self.name!r}>"
+
+def _make_key_builder(parameters, extractors, var_keyword):
+    """Builds a function that turns arguments into a hashable tuple key.
+
+    parameters is a list of (name, default, ignored) tuples for the positional parameters.
+    """
+
+    parameters = [(name, default, ignored, extractors.get(name)) for name, default, ignored in parameters]
+    count = len(parameters)
+    simple = not any(ignored or extractor for _, _, ignored, extractor in parameters)
+
+    def _get_key(*args, **kwargs):
+        # Fast path for the common case of every argument being passed positionally
+        if not kwargs and len(args) == count:
+            if simple:
+                return args
+            return tuple([extractor(arg) if extractor else arg for (_, _, ignored, extractor), arg in zip(parameters, args) if not ignored])
+
+        key = []
+        for index, (name, default, ignored, extractor) in enumerate(parameters):
+            if index < len(args):
+                value = args[index]
+            else:
+                value = kwargs.pop(name, default)
+            if not ignored:
+                key.append(extractor(value) if extractor else value)
+
+        if kwargs:
+            if not var_keyword:
+                raise TypeError(f"Unexpected keyword arguments {', '.join(kwargs)}")
+            key.extend(sorted(kwargs.items()))
+
+        return tuple(key)
+
+    return _get_key
+
+def cache(max_legnth=128, *, ttl=None, max_bytes=None, ignore=("self",), key=None):
+    """Caches the results of a function.
+
+    Keys are tuples of the arguments. Parameters named in ignore are left out of the key,
+    and key maps parameter names to a callable that extracts the part of the argument to
+    use, for example ``key={"guild": cache.attribute("id")}``. The invalidate function
+    takes the same arguments as the function minus the ignored ones.
+    """
+
     def decorator(func):
-        cache = LRUDict(max_legnth=max_legnth)
+        cache = LRUDict(max_legnth=max_legnth, ttl=ttl, max_bytes=max_bytes)
+        extractors = key or {}
+
+        signature = inspect.signature(func)
+        positional = (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+        parameters = [(name, None if param.default is param.empty else param.default, name in ignore) for name, param in signature.parameters.items() if param.kind in positional]
+        var_keyword = any(param.kind == inspect.Parameter.VAR_KEYWORD for param in signature.parameters.values())
+
+        _get_key = _make_key_builder(parameters, extractors, var_keyword)
+        _get_invalidation_key = _make_key_builder([parameter for parameter in parameters if not parameter[2]], extractors, var_keyword)
+
+        # Maps keys to the task that is currently computing them, so concurrent misses share one call
+        pending = {}
 
         def __len__():
             return len(cache)
 
-        def _get_key(*args, **kwargs):
-            return f"{':'.join([repr(arg) for arg in args])}{':'.join([f'{repr(kwarg)}={repr(value)}' for kwarg, value in kwargs.items()])}"
-
         def invalidate(*args, **kwargs):
-            if not args:
+            if not args and not kwargs:
                 cache.clear()
+                # Any in-flight results are now stale, so don't let them be stored
+                pending.clear()
                 return
 
+            return _evict(_get_invalidation_key(*args, **kwargs))
+
+        def _evict(key):
+            pending.pop(key, None)
             try:
-                key = _get_key(*args, **kwargs)
                 cache.pop(key)
                 return True
             except KeyError:
                 return False
 
+        async def broadcast(*args, **kwargs):
+            """Invalidates the key in this process and every other process sharing the database."""
+
+            if not args and not kwargs:
+                invalidate()
+                key = None
+            else:
+                key = _get_invalidation_key(*args, **kwargs)
+                _evict(key)
+
+            if listener:
+                await listener.publish(name, key)
+
+        def _store(key, task):
+            # Only the task that is still registered gets to store its result
+            if pending.get(key) is task:
+                del pending[key]
+                if not task.cancelled() and not task.exception():
+                    cache[key] = task.result()
+            elif not task.cancelled():
+                # Mark the exception as retrieved even if every waiter went away
+                task.exception()
+
+        async def _coalesce(key, args, kwargs):
+            task = pending.get(key)
+            if task is None:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                pending[key] = task
+                task.add_done_callback(functools.partial(_store, key))
+            else:
+                cache.stats.coalesced += 1
+
+            # Shield so that one waiter being cancelled doesn't cancel the call for everyone else
+            return await asyncio.shield(task)
+
         @functools.wraps(func)
         def wrapped(*args, **kwargs):
             key = _get_key(*args, **kwargs)
@@ -57,6 +281,9 @@ def cache(max_legnth = 128):
                 return value
 
             except KeyError:
+                if asyncio.iscoroutinefunction(func):
+                    return _coalesce(key, args, kwargs)
+
                 value = func(*args, **kwargs)
                 if inspect.isawaitable(value):
                     async def coro():
@@ -69,10 +296,131 @@ def cache(max_legnth = 128):
                 return value
 
 
+        name = f"{func.__module__}.{func.__qualname__}"
+
         wrapped.invalidate = invalidate
+        wrapped.broadcast = broadcast
+        wrapped.cache_name = name
         wrapped.cache = cache
+        wrapped.stats = cache.stats
+        wrapped.pending = pending
         wrapped._get_key = _get_key
+        wrapped._get_invalidation_key = _get_invalidation_key
+        wrapped._evict = _evict
         wrapped.__len__ = __len__
+
+        # Re-decorating (e.g. when an extension is reloaded) replaces the old entry
+        caches[name] = wrapped
         return wrapped
 
     return decorator
+
+def _to_key(value):
+    # JSON turns tuples into lists, so turn them back into something hashable
+    if isinstance(value, list):
+        return tuple(_to_key(item) for item in value)
+    return value
+
+class InvalidationListener:
+    """Publishes and subscribes to cache invalidations over Postgres LISTEN/NOTIFY."""
+
+    def __init__(self, pool, *, channel="cache_invalidation"):
+        self.pool = pool
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.connection = None
+        self.closed = False
+
+    async def start(self):
+        """Acquires a dedicated connection and starts listening for invalidations."""
+
+        global listener
+
+        self.connection = await self.pool.acquire()
+        await self.connection.add_listener(self.channel, self._on_notification)
+        self.connection.add_termination_listener(self._on_termination)
+        listener = self
+
+    async def close(self):
+        global listener
+
+        self.closed = True
+        if listener is self:
+            listener = None
+
+        if self.connection and not self.connection.is_closed():
+            await self.connection.remove_listener(self.channel, self._on_notification)
+            await self.pool.release(self.connection)
+        self.connection = None
+
+    async def publish(self, name, key):
+        """Tells every other process to invalidate a key. A key of None clears the whole cache."""
+
+        payload = {"origin": self.origin, "name": name, "key": key}
+        try:
+            payload = json.dumps(payload)
+        except TypeError:
+            # The key can't be represented in JSON, so fall back to clearing the whole cache
+            payload = json.dumps({**payload, "key": None})
+
+        await self.pool.execute("SELECT pg_notify($1, $2);", self.channel, payload)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            log.warning("Received an invalid cache invalidation payload: %r", payload)
+            return
+
+        if data.get("origin") == self.origin:
+            return
+
+        key = data.get("key")
+        func = caches.get(data.get("name"))
+        if not func:
+            handler = handlers.get(data.get("name"))
+            if handler:
+                handler(_to_key(key))
+            return
+
+        if key is None:
+            func.invalidate()
+        else:
+            func._evict(_to_key(key))
+
+    def _on_termination(self, connection):
+        if self.closed:
+            return
+
+        # Invalidations may have been missed while we weren't listening, so nothing cached can be trusted
+        log.warning("Cache invalidation connection was closed. Clearing caches and reconnecting.")
+        self._invalidate_all()
+
+        asyncio.ensure_future(self._reconnect())
+
+    def _invalidate_all(self):
+        for func in caches.values():
+            func.invalidate()
+        for handler in handlers.values():
+            handler(None)
+
+    async def _reconnect(self):
+        connection, self.connection = self.connection, None
+        try:
+            await self.pool.release(connection)
+        except Exception:
+            pass
+
+        delay = 1
+        while not self.closed:
+            try:
+                await self.start()
+                log.info("Reconnected cache invalidation listener")
+
+                # Anything loaded while we were reconnecting could have missed an invalidation too
+                self._invalidate_all()
+                return
+            except Exception as exc:
+                log.warning("Failed to reconnect cache invalidation listener. Retrying in %s seconds.", delay, exc_info=exc)
+                await asyncio.sleep(delay)
+                delay = min(delay*2, 60)
@@ -0,0 +1,198 @@
+import asyncio
+import bisect
+import collections
+import logging
+import os
+import re
+import sys
+import time
+
+from . import cache
+
+log = logging.getLogger("robo_coder.db")
+
+class Histogram:
+    """A fixed bucket latency histogram in milliseconds."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    buckets = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets)+1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, milliseconds):
+        self.counts[bisect.bisect_left(self.buckets, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Gets the upper bound of the bucket the percentile falls into."""
+
+        if not self.count:
+            return 0.0
+
+        target = self.count * percent / 100
+        seen = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bucket, self.max)
+        return self.max
+
+class StatementStats:
+    __slots__ = ("statement", "latency", "errors")
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.latency = Histogram()
+        self.errors = 0
+
+class SlowQuery:
+    __slots__ = ("statement", "milliseconds", "call_site", "when")
+
+    def __init__(self, statement, milliseconds, call_site):
+        self.statement = statement
+        self.milliseconds = milliseconds
+        self.call_site = call_site
+        self.when = time.time()
+
+class AcquireContext:
+    """Wraps an acquire so it can be awaited or used as an async context manager, like asyncpg's."""
+
+    __slots__ = ("pool", "timeout", "connection")
+
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.connection = None
+
+    def __await__(self):
+        return self.pool._acquire(self.timeout).__await__()
+
+    async def __aenter__(self):
+        self.connection = await self.pool._acquire(self.timeout)
+        return self.connection
+
+    async def __aexit__(self, *exc_info):
+        connection, self.connection = self.connection, None
+        await self.pool.release(connection)
+
+class InstrumentedPool:
+    """Wraps an asyncpg pool to record per-statement latency and pool saturation.
+
+    Anything not instrumented here is passed through to the wrapped pool.
+    """
+
+    whitespace_regex = re.compile(r"\s+")
+    literal_regex = re.compile(r"'(?:[^']|'')*'|(?<![\w$])[0-9]+(?:\.[0-9]+)?\b")
+
+    def __init__(self, pool, *, slow_query=0.25):
+        self.pool = pool
+        self.slow_query = slow_query
+        self.started = time.time()
+
+        self.statements = {}
+        self.slow_queries = collections.deque(maxlen=25)
+        self._normalized = cache.LRUDict(max_legnth=1024)
+
+        self.acquire_wait = Histogram()
+        self.acquire_timeouts = 0
+        self.in_use = 0
+        self.max_in_use = 0
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+    def normalize(self, query):
+        """Collapses whitespace and replaces literals so the same statement is always counted together."""
+
+        try:
+            return self._normalized[query]
+        except KeyError:
+            statement = self.literal_regex.sub("?", self.whitespace_regex.sub(" ", query).strip())
+            self._normalized[query] = statement
+            return statement
+
+    def call_site(self):
+        # Walk up the stack until we leave this file, which is the code that made the query
+        frame = sys._getframe(1)
+        while frame and frame.f_code.co_filename == __file__:
+            frame = frame.f_back
+        if not frame:
+            return "unknown"
+        return f"{os.path.relpath(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+    def acquire(self, *, timeout=None):
+        return AcquireContext(self, timeout)
+
+    async def _acquire(self, timeout):
+        start = time.perf_counter()
+        try:
+            connection = await self.pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            raise
+        finally:
+            self.acquire_wait.add((time.perf_counter()-start)*1000)
+
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        return connection
+
+    async def release(self, connection, *, timeout=None):
+        self.in_use -= 1
+        await self.pool.release(connection, timeout=timeout)
+
+    async def _run(self, method, query, args, **kwargs):
+        statement = self.normalize(query)
+        stats = self.statements.get(statement)
+        if not stats:
+            stats = self.statements[statement] = StatementStats(statement)
+
+        async with self.acquire() as connection:
+            start = time.perf_counter()
+            try:
+                return await getattr(connection, method)(query, *args, **kwargs)
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                elapsed = time.perf_counter()-start
+                stats.latency.add(elapsed*1000)
+
+                if elapsed >= self.slow_query:
+                    call_site = self.call_site()
+                    self.slow_queries.append(SlowQuery(statement, elapsed*1000, call_site))
+                    log.warning("Slow query (%.0fms) from %s: %s", elapsed*1000, call_site, statement)
+
+    async def execute(self, query, *args, timeout=None):
+        return await self._run("execute", query, args, timeout=timeout)
+
+    async def executemany(self, query, args, *, timeout=None):
+        return await self._run("executemany", query, (args,), timeout=timeout)
+
+    async def fetch(self, query, *args, timeout=None):
+        return await self._run("fetch", query, args, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        return await self._run("fetchrow", query, args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        return await self._run("fetchval", query, args, timeout=timeout, column=column)
+
+    def reset_stats(self):
+        self.statements.clear()
+        self.slow_queries.clear()
+        self.acquire_wait = Histogram()
+        self.acquire_timeouts = 0
+        self.max_in_use = self.in_use
+        self.started = time.time()
@@ -1,12 +1,13 @@
+import asyncio
 import datetime
+import functools
 import re
 
 import dateutil
 import humanize
-import parsedatetime
 from discord.ext import commands
 
-from . import formats
+from . import cache, formats
 
 class ShortTime:
     """Attempts to parse a time using regex."""
@@ -38,23 +39,179 @@ class ShortTime:
     async def convert(cls, ctx, argument):
         return cls(argument, now=ctx.message.created_at)
 
+def _clock_pattern(prefix):
+    # Bare hours are left to parsedatetime, since "at 5" could mean either 5am or 5pm
+    return (rf"(?P<{prefix}clock>noon|midnight"
+            rf"|(?P<{prefix}hour>[0-9]{{1,2}})(?::(?P<{prefix}minute>[0-9]{{2}}))?\s*(?P<{prefix}meridiem>am|pm)"
+            rf"|(?P<{prefix}hour24>[0-9]{{1,2}}):(?P<{prefix}minute24>[0-9]{{2}}))")
+
+class FastTime:
+    """Parses the most common natural language times with a regex, so parsedatetime is only needed for unusual ones.
+
+    Handles relative times like `in 3 hours` or `2 days from now`, days like `tomorrow` or `friday`
+    optionally followed by `at <time>`, and times of day like `at noon` or `at 5:30pm`. Anything
+    longer, like `in 2 days at 5pm` or `next friday`, is left to parsedatetime.
+    """
+
+    weekdays = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+    units = {"yr": "years", "year": "years", "month": "months", "wk": "weeks", "week": "weeks", "day": "days",
+             "hr": "hours", "hour": "hours", "min": "minutes", "minute": "minutes", "sec": "seconds", "second": "seconds"}
+
+    grammar = (r"(?:in\s+(?:an?|one)\s+|(?:in\s+)?(?P<amount>[0-9]+)\s*)(?P<unit>years?|yrs?|months?|weeks?|wks?|days?|hours?|hrs?|minutes?|mins?|seconds?|secs?)(?:\s+from\s+now)?"
+               rf"|(?P<day>today|tomorrow|(?P<weekday>{'|'.join(weekdays)}))(?:\s+at\s+{_clock_pattern('day_')})?"
+               rf"|(?:at\s+)?{_clock_pattern('')}")
+
+    regex = re.compile(grammar, re.IGNORECASE)
+    start_regex = re.compile(rf"(?:{grammar})(?=\s|$)", re.IGNORECASE)
+    end_regex = re.compile(rf"(?<!\S)(?:{grammar})$", re.IGNORECASE)
+
+    # Words that mean the time carries on past a match, like `at 5pm` after `in 2 days` or `next` before `friday`
+    tokens = (r"[0-9]|(?:at|on|in|by|next|this|from|ago|today|tomorrow|tonight|morning|afternoon|evening|night|noon|midnight|am|pm"
+              r"|years?|yrs?|months?|weeks?|wks?|days?|hours?|hrs?|minutes?|mins?|seconds?|secs?"
+              r"|mon|tues?|wed|thu|thurs|fri|sat|sun|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b")
+    following_regex = re.compile(rf"(?:\s*,|\s+and)?\s*(?:{tokens})", re.IGNORECASE)
+    preceding_regex = re.compile(rf"(?<![^\W\d_])(?:{tokens})(?:\s*,|\s+and)?\s*$", re.IGNORECASE)
+
+    @classmethod
+    def is_whole(cls, argument, start, end):
+        """Checks that the time between start and end isn't part of a longer one that only parsedatetime understands."""
+
+        return not cls.following_regex.match(argument, end) and not cls.preceding_regex.search(argument, 0, start)
+
+    @classmethod
+    def parse(cls, match, *, now):
+        if match.group("unit"):
+            amount = int(match.group("amount") or 1)
+            unit = cls.units[match.group("unit").lower().rstrip("s")]
+            return now+dateutil.relativedelta.relativedelta(**{unit: amount})
+
+        day = match.group("day")
+        prefix = "day_" if day else ""
+        clock = match.group(f"{prefix}clock")
+
+        if clock:
+            clock = clock.lower()
+            if clock == "noon":
+                hour, minute = 12, 0
+            elif clock == "midnight":
+                hour, minute = 0, 0
+            elif match.group(f"{prefix}hour24"):
+                hour, minute = int(match.group(f"{prefix}hour24")), int(match.group(f"{prefix}minute24"))
+            else:
+                hour, minute = int(match.group(f"{prefix}hour")), int(match.group(f"{prefix}minute") or 0)
+                if not 1 <= hour <= 12:
+                    raise commands.BadArgument("Hours must be between 1 and 12 when using am or pm")
+                hour = hour % 12 + (12 if match.group(f"{prefix}meridiem").lower() == "pm" else 0)
+
+            if hour > 23 or minute > 59:
+                raise commands.BadArgument("You provided an invalid time of day")
+            time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        else:
+            # Like parsedatetime, a day without a time keeps the current time
+            time = now
+
+        if not day:
+            # A time of day that has already passed today means tomorrow
+            if time <= now:
+                time += datetime.timedelta(days=1)
+            return time
+
+        day = day.lower()
+        if day == "tomorrow":
+            time += datetime.timedelta(days=1)
+        elif day != "today":
+            days = (cls.weekdays.index(match.group("weekday").lower())-now.weekday()) % 7
+            time += datetime.timedelta(days=days or 7)
+        return time
+
+@functools.lru_cache(maxsize=None)
+def get_calendar():
+    import parsedatetime
+    return parsedatetime.Calendar(version=parsedatetime.VERSION_CONTEXT_STYLE)
+
+# Maps (kind, lowercased time phrase) to the phrase's offset from now if parsedatetime always parses it
+# relative to now, or to None if it depends on when it's parsed, like `5pm`, or hasn't been checked yet
+parse_cache = cache.LRUDict(max_legnth=1024)
+
+# Odd shifts, so that arguments like "at 5pm" don't happen to parse to the same offset twice.
+# There's one starting in each month of the year and in each of the next four years, so anything
+# in months or years, like "a month" or "in 2 years", parses to a different offset at one of them.
+_probes = [datetime.timedelta(days=days, hours=1, minutes=7, seconds=13) for days in (*(round(month*30.44) for month in range(12)), 365, 730, 1095, 1460)]
+
+# Cached phrases are looked for in up to this many words at the start and end of an argument
+_max_phrase_words = 6
+
+def get_cached(kind, phrase, now):
+    """Gets the time a cached relative phrase means, or None if it isn't cached."""
+
+    offset = parse_cache.get((kind, phrase.lower()))
+    if offset is not None:
+        return now+offset
+
+def find_cached(kind, argument, now):
+    """Looks for a cached relative phrase at the start or end of an argument and returns (time, start, end), or None."""
+
+    words = [match.span() for match in re.finditer(r"\S+", argument)]
+    for count in range(min(len(words), _max_phrase_words), 0, -1):
+        for start, end in ((0, words[count-1][1]), (words[-count][0], len(argument))):
+            time = get_cached(kind, argument[start:end], now)
+            if time is not None and FastTime.is_whole(argument, start, end):
+                return time, start, end
+
+def check_relative(kind, phrase, now, time, parse):
+    """Schedules a check of whether parse(phrase, now) always gives a time relative to now, so the phrase can be cached.
+
+    A phrase is relative if parsing it at other times shifts the result by exactly as much. Each phrase
+    is only checked once, after the command that used it has its result.
+    """
+
+    key = (kind, phrase.lower())
+    if key in parse_cache or len(key[1]) != len(phrase):
+        # Already checked, or lowercasing changed the length so positions in it wouldn't line up
+        return
+
+    parse_cache[key] = None
+    asyncio.get_event_loop().call_soon(_check_relative, key, phrase, now, time, parse)
+
+def _check_relative(key, phrase, now, time, parse):
+    for probe in _probes:
+        try:
+            later = parse(phrase, now+probe)
+        except (commands.BadArgument, ValueError):
+            return
+        if later-time != probe:
+            return
+
+    parse_cache[key] = time-now
+
 class HumanTime:
     """Attempts to parse a time using parsedatetime."""
 
-    calendar = parsedatetime.Calendar(version=parsedatetime.VERSION_CONTEXT_STYLE)
-
     def __init__(self, argument, *, now=None):
         now = now or datetime.datetime.utcnow()
-        time, context = self.calendar.parseDT(argument, sourceTime=now)
+
+        match = FastTime.regex.fullmatch(argument)
+        if match:
+            time = FastTime.parse(match, now=now)
+        else:
+            time = get_cached("human", argument, now)
+            if time is None:
+                time = self.parse(argument, now)
+                check_relative("human", argument, now, time, self.parse)
+
+        self.time = time
+        self.past = time < now
+
+    @staticmethod
+    def parse(argument, now):
+        time, context = get_calendar().parseDT(argument, sourceTime=now)
         if not context.hasDateOrTime:
             # No date or time data
             raise commands.BadArgument("I couldn't recognize your time. Try something like `tomorrow` or `3 days`.")
         if not context.hasTime:
             # We have the date, but not the time, so replace it with the time
             time = time.replace(hour=now.hour, minute=now.minute, second=now.second, microsecond=now.microsecond)
-
-        self.time = time
-        self.past = time < now
+        return time
 
     @classmethod
     async def convert(cls, ctx, argument):
@@ -104,18 +261,21 @@ class TimeWithContent(Time):
             if argument.endswith("from now"):
                 argument = argument[:-8].strip()
 
-            parsed = HumanTime.calendar.nlp(argument, sourceTime=now)
-            if not parsed:
-                raise commands.BadArgument("I couldn't recognize your time. Try something like `tomorrow` or `3 days`.")
-            time, context, start, end, text = parsed[0]
+            match = FastTime.start_regex.match(argument)
+            if not match or not FastTime.is_whole(argument, *match.span()):
+                match = FastTime.end_regex.search(argument)
+                if match and not FastTime.is_whole(argument, *match.span()):
+                    match = None
 
-            if not context.hasDateOrTime:
-                raise commands.BadArgument("I couldn't recognize your time. Try something like `tomorrow` or `3 days`.")
-            if not context.hasTime:
-                # We have date date data, but not time, so replace it with time data
-                time = time.replace(hour=now.hour, minute=now.minute, second=now.second, microsecond=now.microsecond)
-            if context.accuracy == parsedatetime.pdtContext.ACU_HALFDAY:
-                time = time.replace(day=now.day+1)
+            if match:
+                time, start, end = FastTime.parse(match, now=now), match.start(), match.end()
+            else:
+                cached = find_cached("nlp", argument, now)
+                if cached:
+                    time, start, end = cached
+                else:
+                    time, start, end = self.parse(argument, now)
+                    check_relative("nlp", argument[start:end], now, time, self.parse_phrase)
 
             if start != 0 and end != len(argument):
                 # Time does not start at the start but it doesn't end at the end either
@@ -135,6 +295,146 @@ class TimeWithContent(Time):
         self.past = time < now
         self.content = content
 
+    @staticmethod
+    def parse(argument, now):
+        parsed = get_calendar().nlp(argument, sourceTime=now)
+        if not parsed:
+            raise commands.BadArgument("I couldn't recognize your time. Try something like `tomorrow` or `3 days`.")
+        time, context, start, end, text = parsed[0]
+
+        if not context.hasDateOrTime:
+            raise commands.BadArgument("I couldn't recognize your time. Try something like `tomorrow` or `3 days`.")
+        if not context.hasTime:
+            # We have date date data, but not time, so replace it with time data
+            time = time.replace(hour=now.hour, minute=now.minute, second=now.second, microsecond=now.microsecond)
+        if context.accuracy == context.ACU_HALFDAY:
+            tomorrow = now+datetime.timedelta(days=1)
+            time = time.replace(year=tomorrow.year, month=tomorrow.month, day=tomorrow.day)
+        return time, start, end
+
+    @classmethod
+    def parse_phrase(cls, phrase, now):
+        # Like parse, but the time has to be the whole phrase
+        time, start, end = cls.parse(phrase, now)
+        if start != 0 or end != len(phrase):
+            raise commands.BadArgument("I couldn't recognize your time. Try something like `tomorrow` or `3 days`.")
+        return time
+
+class Recurrence:
+    """A schedule that repeats, such as every 3 hours, every day at 9:00 or every weekday at 5pm.
+
+    Times of day are in UTC. Recurrences are stored as a dict so they can be kept in a jsonb column.
+    """
+
+    regex = re.compile(
+        """(?:(?P<amount>[0-9]+)\s*)?(?P<unit>minutes?|mins?|hours?|hrs?|days?|weekdays?|weeks?)
+           (?:\s+at\s+(?P<hour>[0-9]{1,2})(?::(?P<minute>[0-9]{2}))?\s*(?P<meridiem>am|pm)?)?(?=\s|$)""",
+           re.VERBOSE | re.IGNORECASE)
+
+    units = {"min": "minutes", "hr": "hours", "hour": "hours", "day": "days", "week": "weeks"}
+    minimum = datetime.timedelta(minutes=5)
+
+    def __init__(self, kind, *, seconds=None, hour=None, minute=None):
+        self.kind = kind
+        self.seconds = seconds
+        self.hour = hour
+        self.minute = minute
+
+    @classmethod
+    def from_match(cls, match, *, now):
+        unit = match.group("unit").lower()
+        amount = int(match.group("amount") or 1)
+
+        hour = match.group("hour")
+        if hour is not None:
+            hour, minute = int(hour), int(match.group("minute") or 0)
+            meridiem = (match.group("meridiem") or "").lower()
+            if meridiem and not 1 <= hour <= 12:
+                raise commands.BadArgument("Hours must be between 1 and 12 when using am or pm")
+            if meridiem == "pm" and hour != 12:
+                hour += 12
+            elif meridiem == "am" and hour == 12:
+                hour = 0
+            if hour > 23 or minute > 59:
+                raise commands.BadArgument("You provided an invalid time of day")
+        else:
+            minute = None
+
+        if unit.startswith("weekday"):
+            if match.group("amount"):
+                raise commands.BadArgument("Weekday reminders can't skip days")
+            return cls("weekdays", hour=now.hour if hour is None else hour, minute=now.minute if minute is None else minute)
+
+        if hour is not None:
+            if not unit.startswith("day") or amount != 1:
+                raise commands.BadArgument("A time of day can only be used with `every day` or `every weekday`")
+            return cls("daily", hour=hour, minute=minute)
+
+        unit = cls.units.get(unit.rstrip("s"), "minutes")
+        delta = datetime.timedelta(**{unit: amount})
+        if delta < cls.minimum:
+            raise commands.BadArgument(f"Recurring timers must be at least {timedelta(now+cls.minimum, when=now)} apart")
+        return cls("interval", seconds=int(delta.total_seconds()))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["kind"], seconds=data.get("seconds"), hour=data.get("hour"), minute=data.get("minute"))
+
+    def to_dict(self):
+        if self.kind == "interval":
+            return {"kind": self.kind, "seconds": self.seconds}
+        return {"kind": self.kind, "hour": self.hour, "minute": self.minute}
+
+    def first(self, now):
+        """Gets the first occurrence after now."""
+
+        if self.kind == "interval":
+            return now+datetime.timedelta(seconds=self.seconds)
+        return self.next_after(now, now=now)
+
+    def next_after(self, previous, *, now=None):
+        """Gets the first occurrence after both the previous one and now, skipping any that were missed."""
+
+        now = max(now or datetime.datetime.utcnow(), previous)
+
+        if self.kind == "interval":
+            interval = datetime.timedelta(seconds=self.seconds)
+            missed = (now-previous) // interval
+            return previous+interval*(missed+1)
+
+        time = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if time <= now:
+            time += datetime.timedelta(days=1)
+        if self.kind == "weekdays":
+            while time.weekday() >= 5:
+                time += datetime.timedelta(days=1)
+        return time
+
+    def __str__(self):
+        if self.kind == "interval":
+            now = datetime.datetime.utcnow()
+            return f"every {timedelta(now+datetime.timedelta(seconds=self.seconds), when=now)}"
+
+        day = "day" if self.kind == "daily" else "weekday"
+        return f"every {day} at {self.hour:02d}:{self.minute:02d} UTC"
+
+class RecurrenceWithContent:
+    """Parses a recurrence like `3 hours` or `weekday at 9am` from the start of the argument and keeps the rest as content."""
+
+    def __init__(self, argument, *, now=None):
+        now = now or datetime.datetime.utcnow()
+        match = Recurrence.regex.match(argument)
+        if not match:
+            raise commands.BadArgument("I couldn't recognize how often to repeat. Try something like `3 hours`, `day at 9:00` or `weekday at 5pm`.")
+
+        self.recurrence = Recurrence.from_match(match, now=now)
+        self.time = self.recurrence.first(now)
+        self.content = argument[match.end():].strip() or "..."
+
+    @classmethod
+    async def convert(cls, ctx, argument):
+        return cls(argument, now=ctx.message.created_at)
+
 def timedelta(time, *, when=None, accuracy=3):
     now = when or datetime.datetime.utcnow()
 
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+
+log = logging.getLogger("robo_coder.migrations")
+
+class Migration:
+    __slots__ = ("version", "name", "filename")
+
+    regex = re.compile(r"(?P<version>[0-9]+)_(?P<name>\w+)\.sql")
+
+    def __init__(self, version, name, filename):
+        self.version = version
+        self.name = name
+        self.filename = filename
+
+    def __str__(self):
+        return f"{self.version:04d}_{self.name}"
+
+    @property
+    def sql(self):
+        with open(self.filename, encoding="utf-8") as file:
+            return file.read()
+
+class DryRun(Exception):
+    """Raised inside a migration's transaction to roll it back during a dry run."""
+
+class Migrator:
+    """Applies the numbered SQL files in the migrations directory in order.
+
+    Applied versions are recorded in the schema_migrations table, so each
+    migration only ever runs once per database.
+    """
+
+    # Arbitrary key for the advisory lock that stops two processes migrating at the same time
+    lock_key = 8_246_173_950
+
+    def __init__(self, pool, *, directory="migrations"):
+        self.pool = pool
+        self.directory = directory
+
+    def discover(self):
+        """Gets every migration in the directory, sorted by version."""
+
+        migrations = []
+        for filename in os.listdir(self.directory):
+            match = Migration.regex.fullmatch(filename)
+            if match:
+                migrations.append(Migration(int(match.group("version")), match.group("name"), os.path.join(self.directory, filename)))
+
+        migrations.sort(key=lambda migration: migration.version)
+
+        versions = [migration.version for migration in migrations]
+        if len(versions) != len(set(versions)):
+            raise RuntimeError("Two migrations have the same version")
+
+        return migrations
+
+    async def ensure_table(self, connection):
+        query = """CREATE TABLE IF NOT EXISTS schema_migrations (
+                   version INT PRIMARY KEY,
+                   name TEXT,
+                   applied_at TIMESTAMP DEFAULT (now() at time zone 'utc')
+                   );
+                """
+        await connection.execute(query)
+
+    async def applied(self, connection):
+        """Gets the versions that have already been applied."""
+
+        await self.ensure_table(connection)
+        query = """SELECT version
+                   FROM schema_migrations;
+                """
+        return {record["version"] for record in await connection.fetch(query)}
+
+    async def pending(self):
+        """Gets the migrations that haven't been applied yet."""
+
+        async with self.pool.acquire() as connection:
+            applied = await self.applied(connection)
+        return [migration for migration in self.discover() if migration.version not in applied]
+
+    async def upgrade(self, *, dry_run=False):
+        """Applies every pending migration and returns the ones that were applied.
+
+        With dry_run, each migration is still run, but inside a transaction that
+        is rolled back, so mistakes in the SQL show up without changing anything.
+        """
+
+        migrations = self.discover()
+
+        async with self.pool.acquire() as connection:
+            # Skip all the work below if the database is already current, which is the usual case on startup
+            applied = await self.applied(connection)
+            if all(migration.version in applied for migration in migrations):
+                log.info("Database schema is up to date")
+                return []
+
+            await connection.execute("SELECT pg_advisory_lock($1);", self.lock_key)
+            try:
+                # Another process may have migrated while we waited for the lock
+                applied = await self.applied(connection)
+                pending = [migration for migration in migrations if migration.version not in applied]
+
+                if dry_run:
+                    await self.dry_run(connection, pending)
+                else:
+                    for migration in pending:
+                        await self.apply(connection, migration)
+            finally:
+                await connection.execute("SELECT pg_advisory_unlock($1);", self.lock_key)
+
+        return pending
+
+    async def apply(self, connection, migration):
+        log.info("Applying migration %s", migration)
+
+        async with connection.transaction():
+            await connection.execute(migration.sql)
+            query = """INSERT INTO schema_migrations (version, name)
+                       VALUES ($1, $2);
+                    """
+            await connection.execute(query, migration.version, migration.name)
+
+    async def dry_run(self, connection, migrations):
+        # Later migrations can depend on earlier ones, so run them all in one transaction that gets rolled back
+        try:
+            async with connection.transaction():
+                for migration in migrations:
+                    await self.apply(connection, migration)
+                raise DryRun()
+        except DryRun:
+            log.info("Rolled back dry run of %s migrations", len(migrations))
+
+async def main(dry_run):
+    import asyncpg
+
+    import config
+
+    pool = await asyncpg.create_pool(config.database_uri, min_size=1, max_size=1)
+    try:
+        migrator = Migrator(pool)
+        migrations = await migrator.upgrade(dry_run=dry_run)
+    finally:
+        await pool.close()
+
+    if not migrations:
+        print("Nothing to migrate")
+    for migration in migrations:
+        print(f"{'Would apply' if dry_run else 'Applied'} {migration}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.get_event_loop().run_until_complete(main("--dry-run" in sys.argv))
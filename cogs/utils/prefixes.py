@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+
+from . import cache
+
+log = logging.getLogger("robo_coder.prefixes")
+
+DEFAULT_PREFIXES = ["r!", "r."]
+DM_PREFIXES = ["r!", "r.", "!"]
+
+class PrefixMatcher:
+    """A precompiled set of prefixes that can cheaply reject messages that can't start with any of them."""
+
+    __slots__ = ("prefixes", "first_characters", "matches_everything")
+
+    def __init__(self, prefixes):
+        self.prefixes = list(prefixes)
+        self.first_characters = frozenset(prefix[0] for prefix in self.prefixes if prefix)
+        self.matches_everything = "" in self.prefixes
+
+    def could_match(self, content):
+        return self.matches_everything or (bool(content) and content[0] in self.first_characters)
+
+class Prefixes:
+    """Represents the guild prefixes stored in the database.
+
+    Every prefix is loaded into memory at startup, keyed by guild ID, and kept up
+    to date by set and by invalidations broadcast from other processes.
+    """
+
+    name = "prefixes"
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.data = {}
+
+        # Matchers are built lazily and thrown away whenever a guild's prefixes change
+        self.matchers = {}
+
+        cache.handlers[self.name] = self.on_invalidation
+
+    async def load(self):
+        """Loads every guild's prefixes from the database."""
+
+        await self.import_file("prefixes.json")
+
+        query = """SELECT guild_id, prefixes
+                   FROM guild_prefixes;
+                """
+        records = await self.bot.db.fetch(query)
+        self.data = {record["guild_id"]: record["prefixes"] for record in records}
+        self.matchers.clear()
+        log.info("Loaded prefixes for %s guilds", len(self.data))
+
+    async def import_file(self, filename):
+        """Imports prefixes from the JSON file they used to be stored in."""
+
+        if not os.path.exists(filename):
+            return
+
+        with open(filename) as file:
+            data = json.load(file)
+
+        query = """INSERT INTO guild_prefixes (guild_id, prefixes)
+                   VALUES ($1, $2)
+                   ON CONFLICT (guild_id) DO NOTHING;
+                """
+        await self.bot.db.executemany(query, [(int(guild_id), prefixes) for guild_id, prefixes in data.items()])
+
+        os.replace(filename, f"{filename}.imported")
+        log.info("Imported prefixes for %s guilds from %s", len(data), filename)
+
+    async def reload(self, guild_id):
+        """Reloads a single guild's prefixes from the database."""
+
+        query = """SELECT prefixes
+                   FROM guild_prefixes
+                   WHERE guild_prefixes.guild_id=$1;
+                """
+        prefixes = await self.bot.db.fetchval(query, guild_id)
+        if prefixes is None:
+            self.data.pop(guild_id, None)
+        else:
+            self.data[guild_id] = prefixes
+        self.matchers.pop(guild_id, None)
+
+    async def set(self, guild_id, prefixes):
+        """Sets a guild's prefixes and tells other processes about the change."""
+
+        query = """INSERT INTO guild_prefixes (guild_id, prefixes)
+                   VALUES ($1, $2)
+                   ON CONFLICT (guild_id) DO UPDATE
+                   SET prefixes=$2;
+                """
+        await self.bot.db.execute(query, guild_id, prefixes)
+        self.data[guild_id] = list(prefixes)
+        self.matchers.pop(guild_id, None)
+
+        if cache.listener:
+            await cache.listener.publish(self.name, (guild_id,))
+
+    def on_invalidation(self, key):
+        if key is None:
+            self.bot.loop.create_task(self.load())
+        else:
+            self.bot.loop.create_task(self.reload(*key))
+
+    def get_matcher(self, guild):
+        """Gets the matcher for a guild, or for DMs if guild is None."""
+
+        guild_id = guild.id if guild else None
+        matcher = self.matchers.get(guild_id)
+        if matcher:
+            return matcher
+
+        user = self.bot.user
+        mentions = [f"<@!{user.id}> ", f"<@{user.id}> "] if user else []
+        if guild:
+            matcher = PrefixMatcher(mentions + self.data.get(guild.id, DEFAULT_PREFIXES))
+        else:
+            matcher = PrefixMatcher(mentions + DM_PREFIXES)
+
+        # Don't keep a matcher without the mentions around, since it would be wrong once we know who we are
+        if user:
+            self.matchers[guild_id] = matcher
+        return matcher
+
+    def clear_matchers(self):
+        self.matchers.clear()
+
+    def get(self, guild_id, default=None):
+        return self.data.get(guild_id, default)
+
+    def __contains__(self, guild_id):
+        return guild_id in self.data
+
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+import traceback
+
+from .db import Histogram
+
+log = logging.getLogger("robo_coder.workers")
+
+class WorkerError(Exception):
+    """Raised when a worker dies before it finishes a job."""
+
+class JobError(Exception):
+    """Raised when a job raises an exception.
+
+    Exceptions are sent back as text, since plenty of them can't be pickled or unpickled.
+    """
+
+    def __init__(self, name, message, traceback):
+        super().__init__(f"{name}: {message}")
+        self.name = name
+        self.message = message
+        self.traceback = traceback
+
+def _worker_main(connection):
+    # The parent decides when workers stop, so don't let Ctrl+C kill them mid-job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        try:
+            func, args, kwargs = connection.recv()
+        except (EOFError, OSError):
+            # The parent closed its end of the pipe
+            return
+
+        try:
+            result = ("result", func(*args, **kwargs))
+        except Exception as exc:
+            result = ("error", (type(exc).__name__, str(exc), traceback.format_exc()))
+
+        try:
+            connection.send(result)
+        except (EOFError, OSError):
+            return
+        except Exception as exc:
+            # Pickling the result failed before anything was written, so there's still room to report it
+            connection.send(("error", (type(exc).__name__, str(exc), traceback.format_exc())))
+
+class Worker:
+    __slots__ = ("process", "connection")
+
+    def __init__(self, context, name):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), name=name, daemon=True)
+        self.process.start()
+        child.close()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    async def run(self, loop, func, args, kwargs, timeout):
+        future = loop.create_future()
+
+        def on_readable():
+            if future.done():
+                return
+            try:
+                future.set_result(self.connection.recv())
+            except (EOFError, OSError):
+                future.set_exception(WorkerError(f"Worker {self.pid} exited unexpectedly"))
+            except Exception as exc:
+                # Anything else means the reply couldn't be unpickled, so the pipe can't be trusted either
+                future.set_exception(WorkerError(f"Couldn't read the reply from worker {self.pid}: {exc}"))
+
+        try:
+            self.connection.send((func, args, kwargs))
+        except (EOFError, OSError) as exc:
+            raise WorkerError(f"Worker {self.pid} exited unexpectedly") from exc
+
+        fileno = self.connection.fileno()
+        loop.add_reader(fileno, on_readable)
+        try:
+            return await asyncio.wait_for(future, timeout, loop=loop)
+        finally:
+            loop.remove_reader(fileno)
+
+    def kill(self, loop):
+        self.process.kill()
+        self.connection.close()
+        # SIGKILL can't be ignored, so this finishes almost immediately, but still shouldn't block the loop
+        loop.run_in_executor(None, self.process.join)
+
+class ProcessPool:
+    """A pool of worker processes for blocking jobs that shouldn't share the bot's GIL or thread pool.
+
+    Unlike concurrent.futures.ProcessPoolExecutor, a job that runs past its timeout
+    has its worker killed and replaced, so a hung job can't hold onto a worker forever.
+    Workers are started with spawn, so jobs must be importable module level functions.
+    """
+
+    def __init__(self, size, *, loop=None, name="worker"):
+        if size <= 0:
+            raise ValueError("size must be greater than 0")
+
+        self.size = size
+        self.loop = loop or asyncio.get_event_loop()
+        self.name = name
+        self.context = multiprocessing.get_context("spawn")
+        self.closed = False
+
+        self.workers = set()
+        self.idle = []
+        self.semaphore = asyncio.Semaphore(size, loop=self.loop)
+
+        self.queued = 0
+        self.max_queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.killed = 0
+        self.queue_wait = Histogram()
+        self.run_time = Histogram()
+
+    def spawn(self):
+        worker = Worker(self.context, f"{self.name}-{len(self.workers)}")
+        self.workers.add(worker)
+        log.info("Started %s worker %s", self.name, worker.pid)
+        return worker
+
+    def discard(self, worker):
+        self.workers.discard(worker)
+        self.killed += 1
+        worker.kill(self.loop)
+
+    def acquire_worker(self):
+        # An idle worker can die too, for example if it's killed for using too much memory
+        while self.idle:
+            worker = self.idle.pop()
+            if worker.process.is_alive():
+                return worker
+            log.warning("Idle %s worker %s exited with code %s", self.name, worker.pid, worker.process.exitcode)
+            self.discard(worker)
+        return self.spawn()
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """Runs func(*args, **kwargs) in a worker and returns the result.
+
+        Exceptions raised by the job are raised here as JobError. If the job takes longer
+        than timeout seconds, its worker is killed and asyncio.TimeoutError is raised.
+        """
+
+        if self.closed:
+            raise RuntimeError(f"The {self.name} pool is closed")
+
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        start = time.perf_counter()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+            self.queue_wait.add((time.perf_counter()-start)*1000)
+
+        if self.closed:
+            self.semaphore.release()
+            raise RuntimeError(f"The {self.name} pool is closed")
+
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            worker = self.acquire_worker()
+            try:
+                status, value = await worker.run(self.loop, func, args, kwargs, timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                log.warning("Killing %s worker %s after a job took more than %ss", self.name, worker.pid, timeout)
+                self.discard(worker)
+                raise
+            except BaseException as exc:
+                # The worker died, or we were cancelled and it would send back a stale result to the next job
+                if isinstance(exc, WorkerError):
+                    self.failures += 1
+                self.discard(worker)
+                raise
+
+            if self.closed:
+                worker.kill(self.loop)
+            else:
+                self.idle.append(worker)
+        finally:
+            self.running -= 1
+            self.run_time.add((time.perf_counter()-start)*1000)
+            self.semaphore.release()
+
+        if status == "error":
+            self.failures += 1
+            raise JobError(*value)
+
+        self.completed += 1
+        return value
+
+    def close(self):
+        """Kills every worker. Jobs that are still running fail with WorkerError, and new ones aren't accepted."""
+
+        self.closed = True
+        for worker in self.idle:
+            worker.kill(self.loop)
+
+        # Busy workers still have a reader on their pipe, so leave closing it to run once the job fails
+        for worker in self.workers.difference(self.idle):
+            worker.process.kill()
+
+        self.workers.clear()
+        self.idle.clear()
@@ -7,6 +7,11 @@ ignore_spam_channels BIGINT ARRAY,
 log_channel_id BIGINT
 );
 
+CREATE TABLE IF NOT EXISTS guild_prefixes (
+guild_id BIGINT PRIMARY KEY,
+prefixes TEXT ARRAY
+);
+
 CREATE TABLE IF NOT EXISTS timers (
 id SERIAL PRIMARY KEY,
 event TEXT,
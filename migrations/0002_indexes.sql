@@ -0,0 +1,16 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Song.from_database and the songs search command use similarity searches on the title
+CREATE INDEX IF NOT EXISTS songs_title_trgm_index ON songs USING GIN (title gin_trgm_ops);
+
+-- The timer loop always looks for the timer that expires next
+CREATE INDEX IF NOT EXISTS timers_expires_at_index ON timers (expires_at);
+
+-- The remind commands filter reminders by the author and channel stored in the data array
+CREATE INDEX IF NOT EXISTS timers_reminder_author_index ON timers ((data #>> '{0}'), (data #>> '{1}')) WHERE event = 'reminder';
+
+-- Moderation.delete_timer deletes tempbans and tempmutes by their whole data array.
+-- Reminders are left out, since their data includes the reminder text, which can be too long to index.
+CREATE INDEX IF NOT EXISTS timers_event_data_index ON timers (event, data) WHERE event IN ('tempban', 'tempmute');
+
+CREATE INDEX IF NOT EXISTS song_searches_song_id_index ON song_searches (song_id);
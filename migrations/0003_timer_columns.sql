@@ -0,0 +1,30 @@
+ALTER TABLE timers
+    ADD COLUMN IF NOT EXISTS guild_id BIGINT,
+    ADD COLUMN IF NOT EXISTS channel_id BIGINT,
+    ADD COLUMN IF NOT EXISTS user_id BIGINT;
+
+-- Reminders were stored as [author_id, channel_id, jump_url, content]
+UPDATE timers
+SET user_id = (data ->> 0)::BIGINT,
+    channel_id = (data ->> 1)::BIGINT,
+    data = jsonb_build_object('jump_url', data ->> 2, 'content', data ->> 3)
+WHERE event = 'reminder' AND jsonb_typeof(data) = 'array';
+
+-- Tempbans and tempmutes were stored as [guild_id, user_id]
+UPDATE timers
+SET guild_id = (data ->> 0)::BIGINT,
+    user_id = (data ->> 1)::BIGINT,
+    data = '{}'::jsonb
+WHERE event IN ('tempban', 'tempmute') AND jsonb_typeof(data) = 'array';
+
+ALTER TABLE timers ALTER COLUMN data SET DEFAULT '{}'::jsonb;
+
+-- These filtered on positions in the data array, which no longer exist
+DROP INDEX IF EXISTS timers_reminder_author_index;
+DROP INDEX IF EXISTS timers_event_data_index;
+
+-- The remind commands list a user's reminders in the order they expire
+CREATE INDEX IF NOT EXISTS timers_event_user_id_expires_at_index ON timers (event, user_id, expires_at);
+
+-- Moderation.delete_timer replaces a member's tempban or tempmute
+CREATE INDEX IF NOT EXISTS timers_event_guild_id_user_id_index ON timers (event, guild_id, user_id);
@@ -0,0 +1,5 @@
+-- A process claims a due timer by leasing it, and deletes it once it has been dispatched.
+-- If the process dies first, the lease expires and another process claims the timer.
+ALTER TABLE timers
+    ADD COLUMN IF NOT EXISTS lease_owner TEXT,
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
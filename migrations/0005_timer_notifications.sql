@@ -0,0 +1,19 @@
+-- Tells the timer loops in every process when a timer is created, rescheduled or deleted.
+-- Expiry is sent as a UTC epoch so it doesn't depend on how the timestamp would be formatted.
+CREATE OR REPLACE FUNCTION notify_timers() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('timers', json_build_object('op', TG_OP, 'id', OLD.id)::TEXT);
+        RETURN OLD;
+    END IF;
+
+    PERFORM pg_notify('timers', json_build_object('op', TG_OP, 'id', NEW.id, 'expires_at', extract(epoch FROM NEW.expires_at))::TEXT);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Leasing a timer doesn't change when it's due, so only changes to expires_at notify on update
+DROP TRIGGER IF EXISTS timers_notify ON timers;
+CREATE TRIGGER timers_notify
+AFTER INSERT OR UPDATE OF expires_at OR DELETE ON timers
+FOR EACH ROW EXECUTE PROCEDURE notify_timers();
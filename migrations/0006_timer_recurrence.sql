@@ -0,0 +1,2 @@
+-- Recurring timers keep a single row whose expires_at is moved to the next occurrence each time it fires
+ALTER TABLE timers ADD COLUMN IF NOT EXISTS recurrence jsonb;
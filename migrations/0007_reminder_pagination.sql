@@ -0,0 +1,4 @@
+-- Reminder listings page through (expires_at, id), optionally in a single channel
+DROP INDEX IF EXISTS timers_event_user_id_expires_at_index;
+CREATE INDEX IF NOT EXISTS timers_event_user_id_expires_at_id_index ON timers (event, user_id, expires_at, id);
+CREATE INDEX IF NOT EXISTS timers_event_user_id_channel_id_expires_at_id_index ON timers (event, user_id, channel_id, expires_at, id);
@@ -0,0 +1,7 @@
+-- The song cache tracks how much disk each download uses, so the total can be summed without touching the disk
+ALTER TABLE songs
+    ADD COLUMN IF NOT EXISTS filesize BIGINT,
+    ADD COLUMN IF NOT EXISTS last_played_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS evicted BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS songs_cached_index ON songs (id) WHERE NOT evicted;